@@ -0,0 +1,7 @@
+import sys
+from benchmarks.run import main
+
+sys.exit(main())
+
+
+# EOF
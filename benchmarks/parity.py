@@ -0,0 +1,152 @@
+import json
+import numpy as np
+import pandas as pd
+from src.algotradebase import AlgoTradeBase
+from src.helpers import get_data_store
+from src.overlap import SuperTrend, supertrend_kernel, supertrend_kernel_loop, supertrend_kernel_numpy
+from src.runner import STRATEGIES, expand_params
+from src.streaming import check_parity
+from src.walkforward import walk_forward
+
+MAD_PERIODS = [5, 20]
+
+# Train/test bars of the walk-forward check.
+WALK_FORWARD_SIZES = (60, 20)
+
+
+def with_nans(values, seed: int = 0, fraction: float = 0.02):
+    """
+    Copy of values (T or T x paths) with a few NaN, so some rolling windows have one.
+    """
+    values = np.array(values, dtype=float)
+    values[np.random.default_rng(seed).random(values.shape) < fraction] = np.nan
+    return values
+
+
+def check_rolling_mad(close, paths_close):
+    """
+    AlgoTradeBase.rolling_mad against Series.rolling(n).apply(AlgoTradeBase.mad), on a series and on
+    a T x paths DataFrame (DataFrame.rolling(n).apply), both with NaN windows. output: [failure].
+    """
+    failures = []
+    inputs = {"1d": pd.Series(with_nans(close)), "2d": pd.DataFrame(with_nans(paths_close, seed=1))}
+    for name, price in inputs.items():
+        for period in MAD_PERIODS:
+            expected = price.rolling(period).apply(AlgoTradeBase.mad).to_numpy()
+            got = AlgoTradeBase.rolling_mad(price, period).to_numpy()
+            if not np.array_equal(got, expected, equal_nan=True):
+                failures.append(f"rolling_mad[{name}] period {period}: max diff {np.nanmax(np.abs(got - expected))}")
+    return failures
+
+
+def check_supertrend(df_data, paths, lookback: int = 10, multiplier: float = 3):
+    """
+    SuperTrend.get_supertrend against the cell by cell get_supertrend_loop, and supertrend_kernel_numpy
+    against the compiled supertrend_kernel (Numba) and the plain supertrend_kernel_loop on the
+    N_sims x T bands of paths. output: [failure].
+    """
+    failures = []
+    high, low, close = (df_data[col].reset_index(drop=True) for col in ["high", "low", "close"])
+    got = SuperTrend.get_supertrend(high, low, close, lookback, multiplier)
+    expected = SuperTrend.get_supertrend_loop(high, low, close, lookback, multiplier)
+    for name, values, reference in zip(["st", "upt", "dt"], got, expected):
+        if not np.array_equal(values.to_numpy(dtype=float), reference.to_numpy(dtype=float), equal_nan=True):
+            failures.append(f"get_supertrend_loop[{name}] lookback {lookback}")
+    high, low, close = (AlgoTradeBase.to_frame(paths[col]) for col in ["high", "low", "close"])
+    upper_band, lower_band = SuperTrend.get_bands(high, low, close, lookback, multiplier)
+    bands = [values.to_numpy().T for values in (upper_band, lower_band, close)]
+    expected = supertrend_kernel_numpy(*(values.copy() for values in bands))
+    for name, kernel in [("compiled", supertrend_kernel), ("loop", supertrend_kernel_loop)]:
+        got = kernel(*(values.copy() for values in bands))
+        if not all(np.array_equal(values, reference, equal_nan=True) for values, reference in zip(got, expected)):
+            failures.append(f"supertrend_kernel[{name}] lookback {lookback}: differs from supertrend_kernel_numpy")
+    return failures
+
+
+def check_apply_strategy_loop(df_data, strategy_params):
+    """
+    apply_strategy against the bar by bar apply_strategy_loop, same M and M_diffs. output: [failure].
+    """
+    failures = []
+    for strategy, params in strategy_params.items():
+        vectorized, loop = STRATEGIES[strategy](params), STRATEGIES[strategy](params)
+        vectorized.apply_strategy(df_data, 1.0)
+        loop.apply_strategy_loop(df_data, 1.0)
+        if vectorized.metrics() != loop.metrics():
+            failures.append(f"apply_strategy_loop[{strategy}]: M {vectorized.M} != {loop.M}")
+    return failures
+
+
+def check_streaming(df_data, strategy_params):
+    """
+    src.streaming.check_parity of every strategy: streamed signals, M and M_diffs as the batch ones.
+    output: [failure].
+    """
+    failures = []
+    for strategy, params in strategy_params.items():
+        parity = check_parity(strategy, params, df_data)
+        if not parity["match"]:
+            failures.append(f"streaming[{strategy}]: {parity}")
+    return failures
+
+
+def window_positions(strategy, params, df_data, end: int):
+    """
+    Positions of one strategy run from scratch on the bars df_data[:end] (signals not shared with the
+    other windows), 1 before its first bar as in apply_strategy.
+    """
+    algo = STRATEGIES[strategy](params)
+    signal, close = algo.strategy(df_data.iloc[:end].copy(), algo.strategy_parameters)
+    position = np.ones(end, dtype=int)
+    position[end - len(close) :] = AlgoTradeBase.get_positions(np.asarray(signal, dtype=float), len(close))
+    return position
+
+
+def check_walk_forward(comp_code, intraday_data, strategy_params):
+    """
+    walk_forward against a per-window brute force: every candidate run on the bars up to the end of
+    the window, its train M ranked and the best traded on the test bars. output: [failure].
+    """
+    train_size, test_size = WALK_FORWARD_SIZES
+    strategies_params = {}
+    for strategy, params in strategy_params.items():
+        lookback = params.get("LOOKBACK_STRATEGY_PARAM")
+        lookbacks = {} if lookback is None else {"LOOKBACK_STRATEGY_PARAM": [lookback // 2, lookback]}
+        strategies_params[strategy] = [{**params, **lookbacks}]
+    run_params = expand_params(strategies_params)
+    result = walk_forward(comp_code, intraday_data, strategies_params, train_size, test_size)
+    df_data = get_data_store(comp_code, intraday_data).daily.reset_index()
+    dates, close = df_data["date"].to_numpy(), df_data["close"].to_numpy(dtype=float)
+    failures = []
+    for row in result.itertuples():
+        start = int(np.searchsorted(dates, np.datetime64(row.train_start)))
+        train, test = slice(start, start + train_size), slice(start + train_size, start + train_size + test_size)
+        positions = [window_positions(strategy, params, df_data, test.stop) for strategy, params in run_params]
+        M_train = [AlgoTradeBase.get_trades(position[train], close[train], 1.0)[0][0] for position in positions]
+        best = int(np.argmax(M_train))
+        M, M_diffs, _ = AlgoTradeBase.get_trades(positions[best][test], close[test], 1.0)
+        strategy, params = run_params[best]
+        expected = (strategy, json.dumps(params), M_train[best], M[0], (M_diffs > 0).sum(), (M_diffs < 0).sum())
+        got = (row.strategy, row.params, row.M_train, row.M_test, row.wins_test, row.losses_test)
+        if got != expected:
+            failures.append(f"walk_forward window {row.window}: {got} != {expected}")
+    return failures
+
+
+def check_all(df_daily, df_intraday, paths, strategy_params):
+    """
+    Every parity check, on the daily and the intraday bars and the simulated paths (N_sims x T ohlcv).
+    output: [failure], empty if all match.
+    """
+    failures = check_rolling_mad(df_daily["close"].to_numpy(), np.asarray(paths["close"]).T)
+    supertrend = strategy_params.get("SuperTrend", {})
+    failures += check_supertrend(
+        df_daily, paths, supertrend.get("LOOKBACK_STRATEGY_PARAM", 10), supertrend.get("MULTIPLIER", 3)
+    )
+    for df_data in [df_daily, df_intraday]:
+        failures += check_apply_strategy_loop(df_data, strategy_params)
+        failures += check_streaming(df_data, strategy_params)
+    return failures
+
+
+# EOF
@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from benchmarks import parity
+from benchmarks.synthetic import write_intraday_data
+from src import helpers
+from src.algotradebase import AlgoTradeBase
+from src.data_cache import CACHE_DIRNAME
+from src.indicator_cache import indicator_cache
+from src.runner import STRATEGIES
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Intraday bars per day of each size (3 years of business days).
+SIZES = {"small": 13, "medium": 26, "large": 78}
+
+STRATEGY_PARAMS = {
+    "ADXRSI": {"LOOKBACK_STRATEGY_PARAM": 14, "RSI": True, "ADX": True},
+    "WilliansppRMACD": {"LOOKBACK_STRATEGY_PARAM": 14},
+    "SMA": {"SHORT_WINDOW": 5, "LONG_WINDOW": 20},
+    "SuperTrend": {"LOOKBACK_STRATEGY_PARAM": 10, "MULTIPLIER": 3},
+    "AwesomeOscillator": {"short_period": 5, "long_period": 34},
+    "CommodityChannelIndex": {"LOOKBACK_STRATEGY_PARAM": 20},
+    "CoppockCurve": {"shortROC": 11, "longROC": 14, "lookbackWMA": 10},
+    "WilliansppR": {"LOOKBACK_STRATEGY_PARAM": 14},
+    "MACD": {},
+}
+
+CODE = "bench"
+
+# Rolling MAD window and number of paths of its 2-D (T x paths) benchmark, rolling.apply is slow.
+MAD_PERIOD = 20
+MAD_PATHS = 5
+
+
+def measure(func, setup=None, repeat: int = 3):
+    """
+    Best wall time of repeat runs of func (setup before each run, not timed), then the peak
+    traced memory (tracemalloc, numpy allocations included) of one more run.
+    """
+    best = np.inf
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def clear_caches():
+    for func in [
+        helpers.load_data,
+        helpers.get_data_store,
+        helpers.get_data_history,
+        helpers.get_decomposition_trend,
+        helpers.get_replication_base,
+        helpers.get_data_history_BackMC,
+    ]:
+        func.cache_clear()
+    indicator_cache.clear()
+
+
+def get_benchmarks(root, n_bars, N_MC_Sims):
+    """
+    [(name, func, setup, n, unit)], n: bars or paths per run, for the throughput.
+    """
+
+    def drop_columnar():
+        clear_caches()
+        shutil.rmtree(os.path.join(root, CACHE_DIRNAME), ignore_errors=True)
+
+    def keep_loaded():
+        clear_caches()
+        helpers.load_data(root, CODE)
+
+    def keep_base():
+        clear_caches()
+        helpers.get_replication_base(CODE, root, "year")
+
+    clear_caches()
+    df_past, _ = helpers.get_data_history(CODE, root, "year")
+    paths = helpers.get_data_history_BackMC(CODE, root, "year", N_MC_Sims, seed=0).ohlcv
+    benchmarks = [
+        ("load_data[csv]", lambda: helpers.load_data(root, CODE), drop_columnar, n_bars, "bars"),
+        ("load_data[columnar]", lambda: helpers.load_data(root, CODE), clear_caches, n_bars, "bars"),
+        ("get_data_history", lambda: helpers.get_data_history(CODE, root, "year"), keep_loaded, n_bars, "bars"),
+        (
+            "get_replication_base",
+            lambda: helpers.get_replication_base(CODE, root, "year"),
+            keep_loaded,
+            n_bars,
+            "bars",
+        ),
+        (
+            "get_data_history_BackMC",
+            lambda: helpers.get_data_history_BackMC(CODE, root, "year", N_MC_Sims, seed=0),
+            keep_base,
+            N_MC_Sims,
+            "paths",
+        ),
+    ]
+    mad_inputs = {
+        "1d": pd.Series(parity.with_nans(df_past["close"].to_numpy())),
+        "2d": pd.DataFrame(parity.with_nans(paths["close"][:MAD_PATHS].T, seed=1)),
+    }
+    for name, price in mad_inputs.items():
+        benchmarks.append(
+            (
+                f"rolling_mad[{name}]",
+                lambda price=price: AlgoTradeBase.rolling_mad(price, MAD_PERIOD),
+                None,
+                price.size,
+                "bars",
+            )
+        )
+        benchmarks.append(
+            (
+                f"rolling.apply(mad)[{name}]",
+                lambda price=price: price.rolling(MAD_PERIOD).apply(AlgoTradeBase.mad),
+                None,
+                price.size,
+                "bars",
+            )
+        )
+    for strategy, params in STRATEGY_PARAMS.items():
+        algo = STRATEGIES[strategy](params)
+        benchmarks.append(
+            (
+                f"apply_strategy[{strategy}]",
+                lambda algo=algo: algo.apply_strategy(df_past, 1.0),
+                indicator_cache.clear,
+                len(df_past),
+                "bars",
+            )
+        )
+        benchmarks.append(
+            (
+                f"apply_strategy_batch[{strategy}]",
+                lambda algo=algo: algo.apply_strategy_batch(paths, 1.0),
+                indicator_cache.clear,
+                N_MC_Sims,
+                "paths",
+            )
+        )
+    return benchmarks
+
+
+def run(sizes=("small", "medium"), N_MC_Sims: int = 100, repeat: int = 5, name_filter: str = None):
+    """
+    Runs every benchmark on deterministic synthetic data of each size.
+    output: DataFrame with name, size, seconds, throughput (unit/s), unit, peak_mb.
+    """
+    rows = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            n_bars = write_intraday_data(root, (CODE,), SIZES[size])
+            for name, func, setup, n, unit in get_benchmarks(root, n_bars, N_MC_Sims):
+                if name_filter and name_filter not in name:
+                    continue
+                seconds, peak = measure(func, setup, repeat)
+                rows.append([name, size, seconds, n / seconds, unit, peak / 2**20])
+            clear_caches()
+    return pd.DataFrame(rows, columns=["name", "size", "seconds", "throughput", "unit", "peak_mb"])
+
+
+def run_parity(size: str = "small", N_MC_Sims: int = 10):
+    """
+    The parity checks (benchmarks.parity) on the synthetic data of size. output: [failure], empty if all match.
+    """
+    with tempfile.TemporaryDirectory() as root:
+        write_intraday_data(root, (CODE,), SIZES[size])
+        clear_caches()
+        df_daily, _ = helpers.get_data_history(CODE, root, "year")
+        df_intraday, _ = helpers.get_data_history(CODE, root, "year", groupby=False)
+        paths = helpers.get_data_history_BackMC(CODE, root, "year", N_MC_Sims, seed=0).ohlcv
+        failures = parity.check_all(df_daily, df_intraday, paths, STRATEGY_PARAMS)
+        failures += parity.check_walk_forward(CODE, root, STRATEGY_PARAMS)
+        clear_caches()
+    return failures
+
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__}
+
+
+def save_baseline(results, path=BASELINE):
+    baseline = {
+        "environment": environment(),
+        "results": {
+            f"{row.name}/{row.size}": {"seconds": row.seconds, "peak_mb": row.peak_mb} for row in results.itertuples()
+        },
+    }
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=1, sort_keys=True)
+
+
+def compare(results, path=BASELINE, tolerance: float = 0.5):
+    """
+    Adds the time and peak memory ratios to the baseline, a benchmark regressed if it's slower
+    or takes more memory than (1 + tolerance) x its baseline.
+    """
+    with open(path) as file:
+        baseline = json.load(file)["results"]
+    results = results.copy()
+    saved = [baseline.get(f"{row.name}/{row.size}", {}) for row in results.itertuples()]
+    results["time_ratio"] = results["seconds"] / [entry.get("seconds", np.nan) for entry in saved]
+    results["peak_ratio"] = results["peak_mb"] / [entry.get("peak_mb", np.nan) for entry in saved]
+    results["regressed"] = (results["time_ratio"] > 1 + tolerance) | (results["peak_ratio"] > 1 + tolerance)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks on synthetic OHLCV data.")
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(SIZES))
+    parser.add_argument("--sims", type=int, default=100, help="Monte Carlo simulations (paths)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default=None, help="only the benchmarks with this in the name")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--no-parity", action="store_true", help="skip the parity checks")
+    args = parser.parse_args(argv)
+
+    failures = [] if args.no_parity else run_parity()
+    for failure in failures:
+        print(f"parity failed: {failure}")
+    if not args.no_parity and not failures:
+        print("parity: ok")
+    results = run(args.sizes, args.sims, args.repeat, args.filter)
+    if not args.save and os.path.exists(args.baseline):
+        results = compare(results, args.baseline, args.tolerance)
+    with pd.option_context("display.width", 160, "display.max_rows", None, "display.float_format", "{:.4g}".format):
+        print(results.to_string(index=False))
+    if args.json:
+        results.to_json(args.json, orient="records", indent=1)
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"baseline saved: {args.baseline}")
+        return int(bool(failures))
+    return int(bool(failures) or results.get("regressed", pd.Series(dtype=bool)).any())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+
+# EOF
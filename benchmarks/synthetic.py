@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import pandas as pd
+
+YEARS = ["2022", "2023", "2024"]
+
+
+def intraday_bars(year: str, bars_per_day: int = 26, seed: int = 0):
+    """
+    Deterministic intraday OHLCV of one year (business days, 15 min bars from 09:30), geometric random walk.
+    """
+    rng = np.random.default_rng([seed, int(year)])
+    days = pd.bdate_range(f"{year}-01-01", f"{year}-12-31").to_numpy()
+    offsets = np.timedelta64(9 * 60 + 30, "m") + np.arange(bars_per_day) * np.timedelta64(15, "m")
+    datetime = (days[:, None] + offsets[None, :]).ravel()
+    n_bars = len(datetime)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, n_bars)))
+    open_ = close * np.exp(rng.normal(0, 0.001, n_bars))
+    spread = np.abs(rng.normal(0, 0.002, n_bars))
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(datetime).strftime("%Y-%m-%d %H:%M:%S"),
+            "open": open_,
+            "high": np.maximum(open_, close) * (1 + spread),
+            "low": np.minimum(open_, close) * (1 - spread),
+            "close": close,
+            "volume": rng.integers(100, 10_000, n_bars),
+        }
+    )
+
+
+def write_intraday_data(root, codes=("amzn",), bars_per_day: int = 26, seed: int = 0):
+    """
+    Writes {root}/{code}_{year}.csv for every code and year, the layout load_data reads.
+    output: number of bars per code.
+    """
+    os.makedirs(root, exist_ok=True)
+    n_bars = 0
+    for i, code in enumerate(codes):
+        n_bars = 0
+        for year in YEARS:
+            df = intraday_bars(year, bars_per_day, seed + i)
+            df.to_csv(os.path.join(root, f"{code}_{year}.csv"), index=False)
+            n_bars += len(df)
+    return n_bars
+
+
+# EOF
@@ -1,4 +1,5 @@
 from src.algotradebase import AlgoTradeBase
+import numpy as np
 import pandas as pd
 
 
@@ -13,51 +14,60 @@ class WilliansppRMACD(AlgoTradeBase):
     def __init__(self, strategy_parameters):
         super().__init__(strategy_parameters)
 
-    @staticmethod
-    def implement_wr_macd(wr, macd, macd_signal):
-        wr_macd_signal = [0]
-        signal = 0
-        for i in range(1, len(wr)):
-            if wr[i - 1] > -50 and wr[i] < -50 and macd[i] > macd_signal[i]:
-                if signal != 1:
-                    signal = 1
-                    wr_macd_signal.append(signal)
-                else:
-                    wr_macd_signal.append(0)
-            elif wr[i - 1] < -50 and wr[i] > -50 and macd[i] < macd_signal[i]:
-                if signal != -1:
-                    signal = -1
-                    wr_macd_signal.append(signal)
-                else:
-                    wr_macd_signal.append(0)
-            else:
-                wr_macd_signal.append(0)
-        return wr_macd_signal
-
-    @staticmethod
-    def get_wr(high, low, close, lookback):
-        highh = high.rolling(lookback).max()
-        lowl = low.rolling(lookback).min()
-        wr = -100 * ((highh - close) / (highh - lowl))
-        return wr
+    @classmethod
+    def implement_wr_macd(cls, wr, macd, macd_signal):
+        wr = np.asarray(wr, dtype=float)
+        macd, macd_signal = np.asarray(macd, dtype=float), np.asarray(macd_signal, dtype=float)
+        wr_prev = cls.lag(wr)
+        return cls.state_signal(
+            (wr_prev > -50) & (wr < -50) & (macd > macd_signal),
+            (wr_prev < -50) & (wr > -50) & (macd < macd_signal),
+        )
 
     def strategy(self, df_data, strategy_parameters):
         LOOKBACK_STRATEGY_PARAM = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
         slow = strategy_parameters.get("SLOW", 26)
         fast = strategy_parameters.get("FAST", 12)
         smooth = strategy_parameters.get("SMOOTH", 9)
-        df_data["wr"] = self.get_wr(df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM)
-        macd, macd_signal, hist = self.get_macd(df_data["close"], slow, fast, smooth)
+        df_data["wr"] = self.indicator(
+            self.get_wr, df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM
+        )
+        macd, macd_signal, hist = self.indicator(self.get_macd, df_data["close"], slow, fast, smooth)
         df_data["macd"] = macd
         df_data["macd_signal"] = macd_signal
         df_data["macd_hist"] = hist
         df_data = df_data.fillna(0)
-        close = df_data["close"].to_list()
+        close = df_data["close"].to_numpy()
         wr_signal = self.implement_wr_macd(
-            df_data["wr"].to_list(), df_data["macd"].to_list(), df_data["macd_signal"].to_list()
+            df_data["wr"].to_numpy(), df_data["macd"].to_numpy(), df_data["macd_signal"].to_numpy()
         )
         return wr_signal, close
 
+    def strategy_batch(self, paths, strategy_parameters):
+        LOOKBACK_STRATEGY_PARAM = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
+        slow = strategy_parameters.get("SLOW", 26)
+        fast = strategy_parameters.get("FAST", 12)
+        smooth = strategy_parameters.get("SMOOTH", 9)
+        high, low, close = (self.to_frame(paths[col]) for col in ["high", "low", "close"])
+        wr = self.indicator(self.get_wr, high, low, close, LOOKBACK_STRATEGY_PARAM).fillna(0).to_numpy().T
+        macd, macd_signal = self.indicator(self.get_macd_batch, close, slow, fast, smooth)
+        macd, macd_signal = np.nan_to_num(macd, nan=0.0), np.nan_to_num(macd_signal, nan=0.0)
+        return self.implement_wr_macd(wr, macd, macd_signal), close.to_numpy().T
+
+    def strategy_sweep(self, df_data, lookbacks):
+        slow = self.strategy_parameters.get("SLOW", 26)
+        fast = self.strategy_parameters.get("FAST", 12)
+        smooth = self.strategy_parameters.get("SMOOTH", 9)
+        high, low, close = (df_data[col].to_numpy(dtype=float) for col in ["high", "low", "close"])
+        highh = self.rolling_extremum_sweep(high, lookbacks, np.maximum)
+        lowl = self.rolling_extremum_sweep(low, lookbacks, np.minimum)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            wr = -100 * ((highh - close) / (highh - lowl))
+        wr[np.isnan(wr)] = 0
+        macd, macd_signal, _ = self.indicator(self.get_macd, df_data["close"], slow, fast, smooth)
+        macd, macd_signal = (frame.iloc[:, 0].fillna(0).to_numpy() for frame in [macd, macd_signal])
+        return self.implement_wr_macd(wr, macd, macd_signal), close
+
 
 class ADXRSI(AlgoTradeBase):
     """
@@ -71,146 +81,163 @@ class ADXRSI(AlgoTradeBase):
     def __init__(self, strategy_parameters):
         super().__init__(strategy_parameters)
 
-    @staticmethod
-    def get_adx(high, low, close, lookback):
-        plus_dm = high.diff()
-        minus_dm = low.diff()
-        plus_dm[plus_dm < 0] = 0
-        minus_dm[minus_dm > 0] = 0
-        tr1 = pd.DataFrame(high - low)
-        tr2 = pd.DataFrame(abs(high - close.shift(1)))
-        tr3 = pd.DataFrame(abs(low - close.shift(1)))
-        frames = [tr1, tr2, tr3]
-        tr = pd.concat(frames, axis=1, join="inner").max(axis=1)
-        atr = tr.rolling(lookback).mean()
-        plus_di = 100 * (plus_dm.ewm(alpha=1 / lookback).mean() / atr)
-        minus_di = abs(100 * (minus_dm.ewm(alpha=1 / lookback).mean() / atr))
-        dx = (abs(plus_di - minus_di) / abs(plus_di + minus_di)) * 100
-        adx = ((dx.shift(1) * (lookback - 1)) + dx) / lookback
-        adx_smooth = adx.ewm(alpha=1 / lookback).mean()
-        return plus_di, minus_di, adx_smooth
-
-    @staticmethod
-    def get_rsi(close, lookback):
-        ret = close.diff()
-        up = []
-        down = []
-        for i in range(len(ret)):
-            if ret[i] < 0:
-                up.append(0)
-                down.append(ret[i])
-            else:
-                up.append(ret[i])
-                down.append(0)
-        up_series = pd.Series(up)
-        down_series = pd.Series(down).abs()
-        up_ewm = up_series.ewm(com=lookback - 1, adjust=False).mean()
-        down_ewm = down_series.ewm(com=lookback - 1, adjust=False).mean()
-        rs = up_ewm / down_ewm
-        rsi = 100 - (100 / (1 + rs))
-        rsi_df = pd.DataFrame(rsi).rename(columns={0: "rsi"}).set_index(close.index)
-        rsi_df = rsi_df.dropna()
-        return rsi_df[3:]
-
-    @staticmethod
-    def adx_strategy(pdi, ndi, adx):
-        adx_signal = [0]
-        signal = 0
-        for i in range(len(adx)):
-            if adx[i - 1] < 25 and adx[i] > 25 and pdi[i] > ndi[i]:
-                if signal != 1:
-                    signal = 1
-                    adx_signal.append(signal)
-                else:
-                    adx_signal.append(0)
-            elif adx[i - 1] < 25 and adx[i] > 25 and ndi[i] > pdi[i]:
-                if signal != -1:
-                    signal = -1
-                    adx_signal.append(signal)
-                else:
-                    adx_signal.append(0)
-            else:
-                adx_signal.append(0)
-        return adx_signal
-
-    @staticmethod
-    def rsi_strategy(rsi):
-        rsi_signal = [0]
-        signal = 0
-        for i in range(len(rsi)):
-            if rsi[i - 1] > 30 and rsi[i] < 30:
-                if signal != 1:
-                    signal = 1
-                    rsi_signal.append(signal)
-                else:
-                    rsi_signal.append(0)
-            elif rsi[i - 1] < 70 and rsi[i] > 70:
-                if signal != -1:
-                    signal = -1
-                    rsi_signal.append(signal)
-                else:
-                    rsi_signal.append(0)
-            else:
-                rsi_signal.append(0)
-        return rsi_signal
-
-    @staticmethod
-    def adx_rsi_strategy(adx, pdi, ndi, rsi):
-        adx_rsi_signal = []
-        signal = 0
-        for i in range(len(adx)):
-            if adx[i] > 35 and pdi[i] < ndi[i] and rsi[i] < 50:
-                if signal != 1:
-                    signal = 1
-                    adx_rsi_signal.append(signal)
-                else:
-                    adx_rsi_signal.append(0)
-            elif adx[i] > 35 and pdi[i] > ndi[i] and rsi[i] > 50:
-                if signal != -1:
-                    signal = -1
-                    adx_rsi_signal.append(signal)
-                else:
-                    adx_rsi_signal.append(0)
-            else:
-                adx_rsi_signal.append(0)
-        return adx_rsi_signal
+    @classmethod
+    def get_adx_arrays(cls, high, low, close, lookback):
+        """
+        get_adx over arrays, high/low/close: T or R x T (R: paths and/or lookbacks), lookback: one or one per row.
+        output: plus_di, minus_di, adx_smooth (R x T), the same values as get_adx row by row.
+        """
+        high, low, close = np.broadcast_arrays(*(np.atleast_2d(np.asarray(v, dtype=float)) for v in (high, low, close)))
+        lookbacks = np.broadcast_to(np.asarray(lookback), close.shape[:1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            plus_dm = high - cls.lag(high)
+            minus_dm = low - cls.lag(low)
+            plus_dm[plus_dm < 0] = 0
+            minus_dm[minus_dm > 0] = 0
+            prev_close = cls.lag(close)
+            tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+            atr = np.empty_like(tr)
+            for period in np.unique(lookbacks):
+                rows = lookbacks == period
+                atr[rows] = cls.sma(pd.DataFrame(tr[rows].T), int(period)).to_numpy().T
+            alpha = 1 / lookbacks
+            com = (1 - alpha) / alpha
+            plus_di = 100 * (cls.ewm_mean(plus_dm, com) / atr)
+            minus_di = np.abs(100 * (cls.ewm_mean(minus_dm, com) / atr))
+            dx = (np.abs(plus_di - minus_di) / np.abs(plus_di + minus_di)) * 100
+            lookbacks = lookbacks[:, None]
+            adx = ((cls.lag(dx) * (lookbacks - 1)) + dx) / lookbacks
+            return plus_di, minus_di, cls.ewm_mean(adx, com)
+
+    @classmethod
+    def get_rsi_arrays(cls, close, lookback):
+        """
+        get_rsi over arrays, close: T or R x T, lookback: one or one per row. output: R x T rsi,
+        NaN where get_rsi has no row (the NaN and the first 3 valid values, its dropna and [3:]).
+        """
+        close = np.atleast_2d(np.asarray(close, dtype=float))
+        com = np.asarray(lookback, dtype=float) - 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ret = close - cls.lag(close)
+            up = np.where(ret < 0, 0.0, ret)
+            down = np.abs(np.where(ret < 0, ret, 0.0))
+            rs = cls.ewm_mean(up, com, adjust=False) / cls.ewm_mean(down, com, adjust=False)
+            rsi = 100 - (100 / (1 + rs))
+        valid = ~np.isnan(rsi)
+        return np.where(valid & (np.cumsum(valid, axis=-1) > 3), rsi, np.nan)
+
+    @classmethod
+    def get_adx(cls, high, low, close, lookback):
+        plus_di, minus_di, adx_smooth = cls.get_adx_arrays(high, low, close, lookback)
+        return (
+            pd.Series(plus_di[0], index=high.index, name=high.name),
+            pd.Series(minus_di[0], index=low.index, name=low.name),
+            pd.Series(adx_smooth[0], index=close.index),
+        )
+
+    @classmethod
+    def get_rsi(cls, close, lookback):
+        rsi = cls.get_rsi_arrays(close, lookback)[0]
+        keep = ~np.isnan(rsi)
+        return pd.DataFrame({"rsi": rsi[keep]}, index=close.index[keep])
+
+    @classmethod
+    def adx_strategy(cls, pdi, ndi, adx):
+        """
+        As the original loop, the decision of bar i is at position i + 1 and bar 0 compares with the last bar.
+        """
+        pdi, ndi, adx = (np.asarray(values, dtype=float) for values in (pdi, ndi, adx))
+        crossed = (np.roll(adx, 1, axis=-1) < 25) & (adx > 25)
+        adx_signal = cls.state_signal(crossed & (pdi > ndi), crossed & (ndi > pdi))
+        return np.concatenate([np.zeros_like(adx_signal[..., :1]), adx_signal], axis=-1)
+
+    @classmethod
+    def rsi_strategy(cls, rsi):
+        """
+        As the original loop, the decision of bar i is at position i + 1 and bar 0 compares with the last bar.
+        """
+        rsi = np.asarray(rsi, dtype=float)
+        rsi_prev = np.roll(rsi, 1, axis=-1)
+        rsi_signal = cls.state_signal((rsi_prev > 30) & (rsi < 30), (rsi_prev < 70) & (rsi > 70))
+        return np.concatenate([np.zeros_like(rsi_signal[..., :1]), rsi_signal], axis=-1)
+
+    @classmethod
+    def adx_rsi_strategy(cls, adx, pdi, ndi, rsi):
+        adx, pdi, ndi, rsi = (np.asarray(values, dtype=float) for values in (adx, pdi, ndi, rsi))
+        return cls.state_signal((adx > 35) & (pdi < ndi) & (rsi < 50), (adx > 35) & (pdi > ndi) & (rsi > 50))
 
     def strategy(self, df_data, strategy_parameters):
         LOOKBACK_STRATEGY_PARAM = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
         RSI = strategy_parameters.get("RSI", True)
         ADX = strategy_parameters.get("ADX", True)
         if RSI and ADX:
-            plus_di, minus_di, adx_smooth = self.get_adx(
-                df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM
+            plus_di, minus_di, adx_smooth = self.indicator(
+                self.get_adx, df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM
             )
             df_data["plus_di"] = pd.DataFrame(plus_di).rename(columns={0: "plus_di"})
             df_data["minus_di"] = pd.DataFrame(minus_di).rename(columns={0: "minus_di"})
-            df_data["rsi"] = self.get_rsi(df_data["close"], LOOKBACK_STRATEGY_PARAM)
+            df_data["rsi"] = self.indicator(self.get_rsi, df_data["close"], LOOKBACK_STRATEGY_PARAM)
             df_data["adx"] = pd.DataFrame(adx_smooth).rename(columns={0: "adx"})
             df_data = self.fillna_with(df_data)
             out_signal = self.adx_rsi_strategy(
-                df_data["adx"].to_list(),
-                df_data["plus_di"].to_list(),
-                df_data["minus_di"].to_list(),
-                df_data["rsi"].to_list(),
+                df_data["adx"].to_numpy(),
+                df_data["plus_di"].to_numpy(),
+                df_data["minus_di"].to_numpy(),
+                df_data["rsi"].to_numpy(),
             )
         elif ADX:
-            plus_di, minus_di, adx_smooth = self.get_adx(
-                df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM
+            plus_di, minus_di, adx_smooth = self.indicator(
+                self.get_adx, df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM
             )
             df_data["plus_di"] = pd.DataFrame(plus_di).rename(columns={0: "plus_di"})
             df_data["minus_di"] = pd.DataFrame(minus_di).rename(columns={0: "minus_di"})
             df_data["adx"] = pd.DataFrame(adx_smooth).rename(columns={0: "adx"})
             df_data = self.fillna_with(df_data)
             out_signal = self.adx_strategy(
-                df_data["plus_di"].to_list(), df_data["minus_di"].to_list(), df_data["adx"].to_list()
+                df_data["plus_di"].to_numpy(), df_data["minus_di"].to_numpy(), df_data["adx"].to_numpy()
             )
         elif RSI:
-            df_data["rsi"] = self.get_rsi(df_data["close"], LOOKBACK_STRATEGY_PARAM)
+            df_data["rsi"] = self.indicator(self.get_rsi, df_data["close"], LOOKBACK_STRATEGY_PARAM)
             df_data = self.fillna_with(df_data)
-            out_signal = self.rsi_strategy(df_data["rsi"].to_list())
-        close = df_data["close"].to_list()
+            out_signal = self.rsi_strategy(df_data["rsi"].to_numpy())
+        close = df_data["close"].to_numpy()
         return out_signal, close
 
+    @classmethod
+    def implement_adx_rsi(cls, RSI, ADX, plus_di=None, minus_di=None, adx=None, rsi=None):
+        if RSI and ADX:
+            return cls.adx_rsi_strategy(adx, plus_di, minus_di, rsi)
+        if ADX:
+            return cls.adx_strategy(plus_di, minus_di, adx)
+        if RSI:
+            return cls.rsi_strategy(rsi)
+        raise ValueError("ADXRSI needs RSI and/or ADX")
+
+    def strategy_batch(self, paths, strategy_parameters):
+        LOOKBACK_STRATEGY_PARAM = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
+        RSI = strategy_parameters.get("RSI", True)
+        ADX = strategy_parameters.get("ADX", True)
+        high, low, close = (np.asarray(paths[col], dtype=float) for col in ["high", "low", "close"])
+        indicators = {}
+        if ADX:
+            adx = self.indicator(self.get_adx_arrays, high, low, close, LOOKBACK_STRATEGY_PARAM)
+            indicators.update(zip(["plus_di", "minus_di", "adx"], adx))
+        if RSI:
+            indicators["rsi"] = self.indicator(self.get_rsi_arrays, close, LOOKBACK_STRATEGY_PARAM)
+        return self.implement_adx_rsi(RSI, ADX, **indicators), close
+
+    def strategy_sweep(self, df_data, lookbacks):
+        RSI = self.strategy_parameters.get("RSI", True)
+        ADX = self.strategy_parameters.get("ADX", True)
+        high, low, close = (df_data[col].to_numpy(dtype=float) for col in ["high", "low", "close"])
+        rows = (len(lookbacks), len(close))
+        indicators = {}
+        if ADX:
+            adx = self.get_adx_arrays(*(np.broadcast_to(v, rows) for v in (high, low, close)), lookbacks)
+            indicators.update(zip(["plus_di", "minus_di", "adx"], adx))
+        if RSI:
+            indicators["rsi"] = self.get_rsi_arrays(np.broadcast_to(close, rows), lookbacks)
+        return self.implement_adx_rsi(RSI, ADX, **indicators), close
+
 
 # EOF
@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Mapping
 from numbers import Number
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
+from src.indicator_cache import indicator_cache
+from src import profiling
 
 Position = int  # 1 or 0
 StrategyIndex = int  # -1, 0 or 1
@@ -10,6 +14,7 @@ ClosePrice = float  # close price >= 0.0
 Positions = List[Position]
 StrategySignal = List[StrategyIndex]
 CloseSignal = List[ClosePrice]
+PathsOHLCV = Mapping[str, np.ndarray]  # {"open", "high", "low", "close", "volume"}: N_sims x T each
 
 
 class AlgoTradeBase(ABC):
@@ -43,6 +48,98 @@ class AlgoTradeBase(ABC):
         """
         return (series - series.mean()).abs().mean()
 
+    @staticmethod
+    def rolling_windows(price, period, func):
+        """
+        Same as price.rolling(period).apply(func) with func over the last axis of sliding-window views,
+        called once for all the windows (and paths). price: Series or T x N_sims DataFrame.
+        """
+        values = np.ascontiguousarray(price.to_numpy(dtype=float).T)
+        out = np.full(values.shape, np.nan)
+        if 0 < period <= values.shape[-1]:
+            out[..., period - 1 :] = func(sliding_window_view(values, period, axis=-1))
+        if isinstance(price, pd.Series):
+            return pd.Series(out, index=price.index, name=price.name)
+        return pd.DataFrame(out.T, index=price.index, columns=price.columns)
+
+    @classmethod
+    def rolling_mad(cls, price, period):
+        """
+        Same as price.rolling(period).apply(mad).
+        """
+        return cls.rolling_windows(
+            price, period, lambda windows: np.abs(windows - windows.mean(axis=-1, keepdims=True)).mean(axis=-1)
+        )
+
+    @staticmethod
+    def sma_sweep(price, periods):
+        """
+        price.rolling(period).mean() for every period at once (len(periods) x T), from one prefix sum.
+        Windows with a NaN are NaN, as in rolling; values match it up to floating-point rounding.
+        """
+        values = np.asarray(price, dtype=float)
+        nan = np.isnan(values)
+        csum = np.concatenate([[0.0], np.cumsum(np.where(nan, 0.0, values))])
+        cnan = np.concatenate([[0], np.cumsum(nan)])
+        sma = np.full((len(periods), len(values)), np.nan)
+        for k, period in enumerate(periods):
+            if 0 < period <= len(values):
+                sums = csum[period:] - csum[:-period]
+                sma[k, period - 1 :] = np.where(cnan[period:] == cnan[:-period], sums / period, np.nan)
+        return sma
+
+    @staticmethod
+    def rolling_extremum_sweep(price, periods, ufunc):
+        """
+        price.rolling(period).max() (ufunc=np.maximum) or .min() (np.minimum) for every period at once
+        (len(periods) x T). Sparse table: extrema over windows of 2**j, each period combines two of them.
+        """
+        values = np.asarray(price, dtype=float)
+        n_bars = len(values)
+        levels = [values]
+        width = 1
+        while width * 2 <= max(periods, default=0):
+            level = np.full(n_bars, np.nan)
+            level[width:] = ufunc(levels[-1][width:], levels[-1][:-width])
+            levels.append(level)
+            width *= 2
+        extremum = np.full((len(periods), n_bars), np.nan)
+        for k, period in enumerate(periods):
+            if 0 < period <= n_bars:
+                j = period.bit_length() - 1
+                level, width = levels[j], 1 << j
+                extremum[k, period - 1 :] = ufunc(level[period - 1 :], level[width - 1 : n_bars - period + width])
+        return extremum
+
+    @staticmethod
+    def ewm_mean(values, com, adjust: bool = True):
+        """
+        ewm(com=com, adjust=adjust).mean() along the last axis of R x T values, one com per row
+        (R: lookbacks and/or paths), one ewm pass over the columns of a T x R frame per distinct com.
+        span: com = (span - 1) / 2, alpha: com = (1 - alpha) / alpha (what pandas does, same values).
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        com = np.broadcast_to(np.asarray(com, dtype=float), values.shape[:1])
+        ewm = np.empty(values.shape)
+        for row_com in np.unique(com):
+            rows = com == row_com
+            ewm[rows] = pd.DataFrame(values[rows].T).ewm(com=row_com, adjust=adjust).mean().to_numpy().T
+        return ewm
+
+    @staticmethod
+    def indicator(func, *args):
+        """
+        func(*args) through the shared indicator cache, see src.indicator_cache.
+        """
+        return indicator_cache(func, *args)
+
+    @staticmethod
+    def get_wr(high, low, close, lookback):
+        highh = high.rolling(lookback).max()
+        lowl = low.rolling(lookback).min()
+        wr = -100 * ((highh - close) / (highh - lowl))
+        return wr
+
     @staticmethod
     def get_macd(price, slow, fast, smooth):
         exp1 = price.ewm(span=fast, adjust=False).mean()
@@ -52,12 +149,201 @@ class AlgoTradeBase(ABC):
         hist = pd.DataFrame(macd["macd"] - signal["signal"]).rename(columns={0: "hist"})
         return macd, signal, hist
 
+    @staticmethod
+    def get_macd_batch(price, slow, fast, smooth):
+        """
+        get_macd for a T x N_sims DataFrame, output: macd and signal as N_sims x T arrays.
+        """
+        macd = price.ewm(span=fast, adjust=False).mean() - price.ewm(span=slow, adjust=False).mean()
+        signal = macd.ewm(span=smooth, adjust=False).mean()
+        return macd.to_numpy().T, signal.to_numpy().T
+
+    @staticmethod
+    def lag(values, n: int = 1):
+        """
+        values[..., i - n] at position i (NaN for i < n), along the last axis.
+        """
+        values = np.asarray(values, dtype=float)
+        lagged = np.full_like(values, np.nan)
+        if n < values.shape[-1]:
+            lagged[..., n:] = values[..., : values.shape[-1] - n]
+        return lagged
+
+    @staticmethod
+    def forward_fill(values, mask, initial):
+        """
+        Carry the last values[mask] forward along the last axis, `initial` before the first one.
+        """
+        last = np.where(mask, np.arange(values.shape[-1]), 0)
+        last = np.maximum.accumulate(last, axis=-1)
+        filled = np.take_along_axis(values, last, axis=-1)
+        return np.where(np.logical_or.accumulate(mask, axis=-1), filled, initial)
+
+    @classmethod
+    def state_signal(cls, enter, exit, initial: StrategyIndex = 0):
+        """
+        Emit 1 where `enter` holds and -1 where `exit` holds (enter first), only when the state changes.
+        Works along the last axis (1-D or paths x T).
+        """
+        event = np.where(enter, 1, np.where(exit, -1, 0))
+        changed = event != 0
+        state = cls.forward_fill(event, changed, initial)
+        before = np.empty_like(state)
+        before[..., :1] = initial
+        before[..., 1:] = state[..., :-1]
+        return np.where(changed & (event != before), event, 0)
+
+    @staticmethod
+    def to_frame(paths):
+        """
+        N_sims x T matrix to a T x N_sims DataFrame, so rolling/ewm run on all paths at once.
+        """
+        return pd.DataFrame(np.asarray(paths, dtype=float).T)
+
     @abstractmethod
     def strategy(self, df_input, strategy_parameters) -> tuple[StrategySignal, CloseSignal]:
         raise NotImplementedError
 
+    def strategy_sweep(self, df_data, lookbacks):
+        """
+        strategy for every LOOKBACK_STRATEGY_PARAM in lookbacks (the other params from self.strategy_parameters),
+        output: signals (len(lookbacks) x T) and close (T).
+        This default runs strategy once per lookback, subclasses override it computing the indicators of all
+        the lookbacks in one pass.
+        """
+        signals = []
+        close = []
+        for lookback in lookbacks:
+            strategy_parameters = dict(self.strategy_parameters, LOOKBACK_STRATEGY_PARAM=lookback)
+            strategy_signal, close = self.strategy(df_data.copy(), strategy_parameters)
+            signals.append(np.asarray(strategy_signal)[: len(close)])
+        return np.array(signals), np.asarray(close, dtype=float)
+
+    def strategy_batch(self, paths: PathsOHLCV, strategy_parameters):
+        """
+        Same as strategy for N simulated paths, output: signals and close (N_sims x T each).
+        This default runs strategy path by path, subclasses override it with an array implementation.
+        """
+        signals = []
+        closes = []
+        for i in range(len(paths["close"])):
+            df_data = pd.DataFrame({col: values[i] for col, values in paths.items()})
+            strategy_signal, close = self.strategy(df_data, strategy_parameters)
+            signals.append(np.asarray(strategy_signal)[: len(close)])
+            closes.append(close)
+        return np.array(signals), np.array(closes, dtype=float)
+
+    @classmethod
+    def get_positions(cls, strategy_signal, n_bars: int):
+        """
+        Forward-fill the strategy signal (1: buy, -1: sell, 0: keep) into positions (1 or 0).
+        Before the first signal the position is 1. Works along the last axis (1-D or paths x T).
+        """
+        signal = np.asarray(strategy_signal)
+        if signal.shape[-1] < n_bars:
+            raise IndexError("strategy signal is shorter than the close history")
+        signal = signal[..., :n_bars]
+        state = cls.forward_fill(signal, (signal == 1) | (signal == -1), 1)
+        return np.where(state == -1, 0, 1)
+
+    @staticmethod
+    def get_trades(position, close, M_initial):
+        """
+        Buy at every 0 -> 1 position change (or at the first bar), sell at every 1 -> 0 change
+        and at the last bar if still bought.
+        input: position and close (T or paths x T), M_initial (scalar or one per path).
+        output: M (one per path), M_diffs (paths x max. trades, NaN padded), number of trades per path.
+        """
+        position = np.atleast_2d(position)
+        close = np.atleast_2d(np.asarray(close, dtype=float))
+        n_paths, n_bars = close.shape
+        M = np.broadcast_to(np.asarray(M_initial, dtype=float), (n_paths,)).copy()
+        if n_bars == 0:
+            return M, np.empty((n_paths, 0)), np.zeros(n_paths, dtype=int)
+        bought = position == 1
+        before = np.zeros_like(bought)
+        before[:, 1:] = bought[:, :-1]
+        entries = bought & ~before
+        exits = ~bought & before
+        exits[:, -1] |= bought[:, -1]
+        n_trades = entries.sum(axis=1)
+        first = np.cumsum(n_trades) - n_trades
+        max_trades = n_trades.max()
+        entry_price = np.ones((n_paths, max_trades))
+        exit_price = np.ones((n_paths, max_trades))
+        rows, cols = np.nonzero(entries)
+        entry_price[rows, np.arange(len(rows)) - first[rows]] = close[rows, cols]
+        rows, cols = np.nonzero(exits)
+        exit_price[rows, np.arange(len(rows)) - first[rows]] = close[rows, cols]
+        # The budget compounds trade by trade, same operation order as apply_strategy_loop.
+        M_diffs = np.full((n_paths, max_trades), np.nan)
+        for k in range(max_trades):
+            traded = k < n_trades
+            M_after = exit_price[:, k] * (M / entry_price[:, k])
+            M_diffs[traded, k] = M_after[traded] - M[traded]
+            M = np.where(traded, M_after, M)
+        return M, M_diffs, n_trades
+
     def apply_strategy(self, df_input, M_initial: Bugedt = None):
         """
+        external input: M: initial budget.
+        internal input: self.position_hist, self.close_hist)
+        internal output:
+            M_diffs: performance by operation, diff between buy and sell.
+            M: final bugdet.
+        """
+        name = type(self).__name__
+        df_data = df_input.copy()
+        n_bars = len(df_data)
+        with profiling.phase(f"{name}.strategy", n_bars):
+            strategy_signal, self.close_hist = self.strategy(df_data, self.strategy_parameters)
+        with profiling.phase(f"{name}.get_positions", n_bars):
+            self.position_hist = self.get_positions(strategy_signal, len(self.close_hist))
+        M = self.M if M_initial is None else M_initial
+        with profiling.phase(f"{name}.get_trades", n_bars):
+            M, M_diffs, n_trades = self.get_trades(self.position_hist, self.close_hist, M)
+        self.M = M[0].item()
+        self.M_diffs = M_diffs[0, : n_trades[0]].tolist()
+
+    def apply_strategy_batch(self, paths: PathsOHLCV, M_initial: Bugedt = None):
+        """
+        apply_strategy over N simulated paths at once.
+        external input:
+            paths: {"open", "high", "low", "close", "volume"}, N_sims x T each.
+            M: initial budget.
+        output: M (final budget), wins and losses (number of operations with M_diffs > 0 and < 0), N_sims each.
+        """
+        name = type(self).__name__
+        n_bars = np.size(paths["close"])
+        with profiling.phase(f"{name}.strategy_batch", n_bars):
+            strategy_signal, close = self.strategy_batch(paths, self.strategy_parameters)
+        with profiling.phase(f"{name}.get_positions", n_bars):
+            position = self.get_positions(strategy_signal, close.shape[-1])
+        M = self.M if M_initial is None else M_initial
+        with profiling.phase(f"{name}.get_trades", n_bars):
+            M, M_diffs, _ = self.get_trades(position, close, M)
+        return M, (M_diffs > 0).sum(axis=1), (M_diffs < 0).sum(axis=1)
+
+    def apply_strategy_sweep(self, df_input, lookbacks, M_initial: Bugedt = None):
+        """
+        apply_strategy for every LOOKBACK_STRATEGY_PARAM in lookbacks at once.
+        output: M (final budget), wins and losses (number of operations with M_diffs > 0 and < 0), one per lookback.
+        """
+        name = type(self).__name__
+        n_bars = len(df_input) * len(lookbacks)
+        with profiling.phase(f"{name}.strategy_sweep", n_bars):
+            strategy_signal, close = self.strategy_sweep(df_input.copy(), lookbacks)
+        with profiling.phase(f"{name}.get_positions", n_bars):
+            position = self.get_positions(strategy_signal, len(close))
+        M = self.M if M_initial is None else M_initial
+        with profiling.phase(f"{name}.get_trades", n_bars):
+            M, M_diffs, _ = self.get_trades(position, np.broadcast_to(close, position.shape), M)
+        return M, (M_diffs > 0).sum(axis=1), (M_diffs < 0).sum(axis=1)
+
+    def apply_strategy_loop(self, df_input, M_initial: Bugedt = None):
+        """
+        Reference (bar by bar) implementation of apply_strategy, kept for parity checks.
+
         external input: M: initial budget.
         internal input: self.position_hist, self.close_hist)
         internal output:
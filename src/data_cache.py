@@ -0,0 +1,76 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+CACHE_DIRNAME = ".columnar"
+MANIFEST = "manifest.json"
+
+
+def source_stamp(files):
+    """
+    Identity of the source files of a cache entry: [[key, path, mtime_ns, size]] for files {key: path}.
+    Any change of a source file (or of the set of files) changes the stamp and invalidates the entry.
+    """
+    stamp = []
+    for key, path in files.items():
+        stat = os.stat(path)
+        stamp.append([key, os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+    return stamp
+
+
+def read_columns(cache_dir, stamp):
+    """
+    DataFrame of a cache entry, numeric and datetime columns are views of copy-on-write memory maps of the
+    .npy files (no copy, no parsing until a page is written): writable as a DataFrame parsed from the CSVs,
+    and the writes never reach the files. None if the entry is missing, incomplete or stale.
+    """
+    try:
+        with open(os.path.join(cache_dir, MANIFEST)) as file:
+            manifest = json.load(file)
+        if manifest["sources"] != stamp:
+            return None
+        columns = {}
+        for i, (name, dtype) in enumerate(manifest["columns"]):
+            values = np.asarray(np.load(os.path.join(cache_dir, f"{i}.npy"), mmap_mode="c"))
+            columns[name] = values if dtype is None else pd.Series(values).astype(dtype)
+    except (OSError, ValueError, KeyError):
+        return None
+    return pd.DataFrame(columns, copy=False)
+
+
+def write_columns(cache_dir, stamp, df):
+    """
+    Saves df as one .npy file per column plus a manifest with the source stamp.
+    Every file is written aside and renamed, the manifest last, so concurrent readers (and writers,
+    e.g. pool workers) never see a partial entry. The cache is optional: write errors are ignored.
+    """
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        columns = []
+        for i, name in enumerate(df.columns):
+            values = df[name].to_numpy()
+            dtype = None
+            if values.dtype.kind not in "biufM":
+                dtype = str(df[name].dtype)
+                values = np.asarray(values, dtype=str)
+            replace_file(os.path.join(cache_dir, f"{i}.npy"), lambda file: np.save(file, values))
+            columns.append([name, dtype])
+        manifest = {"sources": stamp, "columns": columns}
+        replace_file(os.path.join(cache_dir, MANIFEST), lambda file: file.write(json.dumps(manifest).encode()))
+    except OSError:
+        pass
+
+
+def replace_file(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            write(file)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# EOF
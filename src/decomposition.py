@@ -0,0 +1,97 @@
+import numpy as np
+
+PERIOD = 4
+
+
+def ma_filter(period: int = PERIOD):
+    """
+    Weights of the centered moving average of statsmodels' seasonal_decompose (2 x period MA for an even period).
+    """
+    if period % 2 == 0:
+        return np.array([0.5] + [1] * (period - 1) + [0.5]) / period
+    return np.repeat(1.0 / period, period)
+
+
+def check_close(close, period: int = PERIOD):
+    close = np.asarray(close, dtype=float)
+    if np.isnan(close).any():
+        raise ValueError("This function does not handle missing values")
+    if close.shape[-1] < 2 * period:
+        raise ValueError(f"x must have 2 complete cycles requires {2 * period} observations")
+    return close
+
+
+def moving_average_trend(close, period: int = PERIOD):
+    """
+    Trend of the additive decomposition along the last axis of close (T, or R x T: R tickers), NaN in the
+    first and last len(ma_filter) // 2 bars. The same values as statsmodels' convolution (up to
+    floating-point rounding for long periods, e.g. 12).
+    """
+    close = np.asarray(close, dtype=float)
+    filt = ma_filter(period)
+    width, n_bars = len(filt), close.shape[-1]
+    trend = np.full(close.shape, np.nan)
+    if n_bars >= width:
+        head = width // 2
+        trend[..., head : n_bars - head] = sum(filt[k] * close[..., k : n_bars - width + 1 + k] for k in range(width))
+    return trend
+
+
+def seasonal_component(detrended, period: int = PERIOD):
+    """
+    Mean of every phase (bar % period) of detrended, ignoring NaN, centered and repeated along the last axis.
+    """
+    detrended = np.asarray(detrended, dtype=float)
+    means = []
+    for phase in range(period):
+        values = detrended[..., phase::period]
+        valid = ~np.isnan(values)
+        means.append(np.where(valid, values, 0.0).sum(axis=-1) / valid.sum(axis=-1))
+    means = np.stack(means, axis=-1)
+    means -= means.mean(axis=-1, keepdims=True)
+    return np.take(means, np.arange(detrended.shape[-1]) % period, axis=-1)
+
+
+def seasonal_decompose(close, period: int = PERIOD):
+    """
+    Additive moving-average decomposition, statsmodels' seasonal_decompose(close, model="additive",
+    period=period) in NumPy (same values, see moving_average_trend), along the last axis of close
+    (T, or R x T: R tickers).
+    output: trend, seasonal, resid (NaN where the trend is).
+    """
+    close = check_close(close, period)
+    trend = moving_average_trend(close, period)
+    detrended = close - trend
+    seasonal = seasonal_component(detrended, period)
+    return trend, seasonal, detrended - seasonal
+
+
+def prefix_decompose(close, trend, n_bars: int, period: int = PERIOD):
+    """
+    seasonal_decompose of close[:n_bars] from the trend of the whole close (moving_average_trend):
+    the moving average only looks len(ma_filter) // 2 bars ahead, so it's the same trend up to its end.
+    """
+    close = check_close(close[..., :n_bars], period)
+    trend = trend[..., :n_bars].copy()
+    trend[..., max(n_bars - len(ma_filter(period)) // 2, 0) :] = np.nan
+    detrended = close - trend
+    seasonal = seasonal_component(detrended, period)
+    return trend, seasonal, detrended - seasonal
+
+
+def decompose(close, period: int = PERIOD, method: str = "numpy"):
+    """
+    seasonal_decompose, or statsmodels' own with method="statsmodels" (imported only then).
+    output: trend, seasonal, resid arrays.
+    """
+    if method == "numpy":
+        return seasonal_decompose(close, period)
+    if method != "statsmodels":
+        raise ValueError(f"unknown decomposition method: {method}")
+    from statsmodels.tsa.seasonal import seasonal_decompose as sm_seasonal_decompose
+
+    result = sm_seasonal_decompose(close, model="additive", period=period)
+    return tuple(np.asarray(values, dtype=float) for values in (result.trend, result.seasonal, result.resid))
+
+
+# EOF
@@ -1,18 +1,34 @@
+import os
 import pandas as pd
 from glob import glob
 from functools import cache
-from statsmodels.tsa.seasonal import seasonal_decompose
 import numpy as np
+from src.data_cache import CACHE_DIRNAME, read_columns, source_stamp, write_columns
+from src.decomposition import decompose, moving_average_trend, prefix_decompose
+from src.noise import GaussianNoise
+from src import profiling
 
 company_code_list = sorted(["amzn", "ibm", "iwm", "msft", "nvda", "qqq", "spx", "tsla"])
 
 
+@profiling.instrument()
 @cache
 def load_data(intraday_data, code):
+    """
+    Intraday bars of one company (the yearly CSVs), from a columnar on-disk cache
+    ({intraday_data}/.columnar/{code}) when it is up to date with the CSVs (mtime/size),
+    so other processes and later runs don't parse the CSVs again.
+    """
     csv_files = {
         y: next((csv for csv in glob(f"{intraday_data}/*.csv") if code in csv and y in csv), None)
         for y in ["2022", "2023", "2024"]
     }
+    csv_files = {year: file for year, file in csv_files.items() if file}
+    cache_dir = os.path.join(intraday_data, CACHE_DIRNAME, code)
+    stamp = source_stamp(csv_files)
+    df = read_columns(cache_dir, stamp)
+    if df is not None:
+        return df
 
     dfs = []
     for year, file in csv_files.items():
@@ -27,21 +43,18 @@ def load_data(intraday_data, code):
 
     df = pd.concat(dfs, ignore_index=True)
     df["datetime"] = pd.to_datetime(df["date"])
-    return df.drop(columns=["date"])
+    df = df.drop(columns=["date"])
+    write_columns(cache_dir, stamp, df)
+    return df
 
 
-@cache
-def get_data_history(comp_code, intraday_data: str, semester: str = "year", groupby: bool = True):
-    df = load_data(intraday_data, comp_code)
-    if df.empty:
-        return pd.DataFrame(), pd.DataFrame()
-
-    max_date = df["datetime"].max().date()
-    one_year_ago = (max_date - pd.DateOffset(years=1)).date()
-    six_months_ago = (max_date - pd.DateOffset(months=6)).date()
+class TickerData:
+    """
+    Data store of one company, built once from the load_data bars (not modified):
+    the daily OHLCV bars and the day of every bar, sorted, so any get_data_history split
+    is a pair of searchsorted slices of the daily (or intraday) bars.
+    """
 
-    df["date"] = df["datetime"].dt.date
-    groupby_cols = ["company_code", "date"]
     values_cols = {
         "open": "first",
         "high": "max",
@@ -49,73 +62,279 @@ def get_data_history(comp_code, intraday_data: str, semester: str = "year", grou
         "close": "last",
         "volume": "sum",
     }
-    if groupby:
-        df = df.groupby(groupby_cols).agg(values_cols)
-        df.reset_index(inplace=True)
 
-    if semester == "1st":
-        past_cutoff, future_cutoff = one_year_ago, six_months_ago
-    elif semester == "2nd":
-        past_cutoff, future_cutoff = six_months_ago, max_date
-    else:  # year
-        past_cutoff, future_cutoff = one_year_ago, max_date
+    def __init__(self, intraday):
+        self.intraday = intraday.assign(date=intraday["datetime"].dt.date)
+        self.daily = self.intraday.groupby(["company_code", "date"]).agg(self.values_cols).reset_index()
+        days = intraday["datetime"].to_numpy().astype("datetime64[D]")
+        # Stable sort of the intraday bars by day, the identity for date-sorted CSVs.
+        self.order = np.argsort(days, kind="stable")
+        self.is_sorted = bool(np.all(self.order == np.arange(len(days))))
+        self.intraday_days = days[self.order]
+        self.daily_days = self.daily["date"].to_numpy().astype("datetime64[D]")
+        self.max_date = intraday["datetime"].max().date()
+
+    def cutoffs(self, semester: str = "year"):
+        """
+        (past cutoff, future cutoff) dates of a period: past < past cutoff <= future < future cutoff.
+        """
+        one_year_ago = (self.max_date - pd.DateOffset(years=1)).date()
+        six_months_ago = (self.max_date - pd.DateOffset(months=6)).date()
+        if semester == "1st":
+            return one_year_ago, six_months_ago
+        if semester == "2nd":
+            return six_months_ago, self.max_date
+        return one_year_ago, self.max_date  # year
 
-    df_out_past = df[df["date"] < past_cutoff].reset_index()
-    df_out_future = df[(df["date"] >= past_cutoff) & (df["date"] < future_cutoff)].reset_index()
+    def bounds(self, semester: str = "year", groupby: bool = True):
+        """
+        Positions (in the day-sorted bars) of the past and future cutoffs, O(log n).
+        """
+        days = self.daily_days if groupby else self.intraday_days
+        past_cutoff, future_cutoff = (np.datetime64(cutoff, "D") for cutoff in self.cutoffs(semester))
+        past_end = np.searchsorted(days, past_cutoff)
+        return past_end, max(past_end, np.searchsorted(days, future_cutoff))
 
-    return df_out_past, df_out_future
+    def rows(self, df, start, stop, groupby):
+        if groupby or self.is_sorted:
+            return df.iloc[start:stop].reset_index()
+        # Unsorted intraday bars: the bars of those days, in the original order.
+        return df.iloc[np.sort(self.order[start:stop])].reset_index()
 
+    def split(self, semester: str = "year", groupby: bool = True):
+        """
+        get_data_history: (past, future) daily bars (intraday bars if not groupby), with the
+        position of each row in the daily (intraday) bars as "index". Slices, no copy of the data.
+        """
+        df = self.daily if groupby else self.intraday
+        past_end, future_end = self.bounds(semester, groupby)
+        return self.rows(df, 0, past_end, groupby), self.rows(df, past_end, future_end, groupby)
 
+    def arrays(self, groupby: bool = True):
+        """
+        The OHLCV columns and the days (datetime64[D]) of the daily bars (intraday bars if not groupby,
+        sorted by day) as arrays, for the array engines.
+        """
+        if groupby:
+            return {"date": self.daily_days, **{col: self.daily[col].to_numpy() for col in self.values_cols}}
+        intraday = self.intraday if self.is_sorted else self.intraday.iloc[self.order]
+        return {"date": self.intraday_days, **{col: intraday[col].to_numpy() for col in self.values_cols}}
+
+
+@profiling.instrument()
+@cache
+def get_data_store(comp_code, intraday_data):
+    """
+    TickerData of a company, None if there is no data.
+    """
+    df = load_data(intraday_data, comp_code)
+    if df.empty:
+        return None
+    return TickerData(df)
+
+
+@profiling.instrument()
+@cache
+def get_data_history(comp_code, intraday_data: str, semester: str = "year", groupby: bool = True):
+    store = get_data_store(comp_code, intraday_data)
+    if store is None:
+        return pd.DataFrame(), pd.DataFrame()
+    return store.split(semester, groupby)
+
+
+@profiling.instrument()
 @cache
 def get_data_history_ForwardMC(comp_code, intraday_data, period, N_MC_Sims):
     _, df_future = get_data_history(comp_code, intraday_data, period)
     return [df_future] * N_MC_Sims
 
 
+class MCPaths:
+    """
+    N_MC_Sims simulated daily paths of one company, sharing the same date index.
+    ohlcv: {"open", "high", "low", "close", "volume"}, N_MC_Sims x len(date) arrays,
+    the input of AlgoTradeBase.apply_strategy_batch.
+    Indexing/iterating gives one DataFrame per simulation, as the daily bars of get_data_history.
+    """
+
+    def __init__(self, company_code, date, ohlcv):
+        self.company_code = company_code
+        self.date = date
+        self.ohlcv = ohlcv
+
+    def __len__(self):
+        return len(self.ohlcv["close"])
+
+    def __getitem__(self, sim_n):
+        df = pd.DataFrame({col: values[sim_n] for col, values in self.ohlcv.items()})
+        df.insert(0, "date", self.date)
+        df.insert(0, "company_code", self.company_code)
+        return df
+
+    def __iter__(self):
+        return (self[sim_n] for sim_n in range(len(self)))
+
+
+def get_daily_buckets(datetime):
+    """
+    Daily buckets of intraday bars, to aggregate them with np.<ufunc>.reduceat.
+    output: dates (sorted), order (stable sort of the bars by date), starts (first bar of each date in order).
+    """
+    codes, dates = pd.factorize(datetime.dt.date, sort=True)
+    order = np.argsort(codes, kind="stable")
+    starts = np.searchsorted(codes[order], np.arange(len(dates)))
+    return dates.to_numpy(), order, starts
+
+
+@profiling.instrument()
+@cache
+def get_decomposition_trend(comp_code, intraday_data):
+    """
+    Intraday close of a company's whole history (sorted by date) and its decomposition trend, computed once
+    for every period: the past of each one is a prefix of it (see decomposition.prefix_decompose).
+    """
+    close = get_data_store(comp_code, intraday_data).arrays(groupby=False)["close"].astype(float)
+    return close, moving_average_trend(close)
+
+
+@profiling.instrument()
 @cache
-def get_data_history_BackMC(comp_code, intraday_data, period, N_MC_Sims):
+def get_replication_base(comp_code, intraday_data, period, method: str = "numpy"):
+    """
+    Everything the replication step needs that is the same for every simulation:
+    the clean series (trend + seasonal) of the past intraday close sorted by date, the residual
+    mean/std, the residual of the last bar of each day (for the noise models, see src.noise)
+    and the daily buckets (see get_daily_buckets).
+    method: "numpy" (src.decomposition) or "statsmodels" (its seasonal_decompose, same values).
+    """
     df_past, _ = get_data_history(comp_code, intraday_data, period, groupby=False)
-    # Decompose the time series into trend, seasonal, and residual components
-    # using the seasonal_decompose function from the statsmodels library.
-    close = df_past.set_index("datetime")["close"]
-    decomposition = seasonal_decompose(close, model="additive", period=4)
-    # Extract the trend, seasonal, and residual components from the decomposition.
-    trend = decomposition.trend
-    seasonal = decomposition.seasonal
-    residual = decomposition.resid
-    # Calculate the mean of the residual component.
-    residual_mean = residual.mean()
-    # Calculate the standard deviation of the residual component.
-    residual_std = residual.std()
-    # Generate random samples from a normal distribution with the same mean and standard deviation as the residual component.
-    random_samples = np.random.normal(residual_mean, residual_std, size=(N_MC_Sims, len(residual)))
-    # Add the random samples to the residual component to generate the Monte Carlo simulations.
+    # Decompose the time series into trend, seasonal, and residual components (additive, period 4).
+    close = df_past["close"].to_numpy(dtype=float)
+    if method == "numpy" and get_data_store(comp_code, intraday_data).is_sorted:
+        full_close, full_trend = get_decomposition_trend(comp_code, intraday_data)
+        trend, seasonal, residual = prefix_decompose(full_close, full_trend, len(close))
+    else:
+        trend, seasonal, residual = decompose(df_past.set_index("datetime")["close"], method=method)
     clean_series = trend + seasonal
+    clean_series = np.where(np.isnan(clean_series), close, clean_series)
+
+    dates, order, starts = get_daily_buckets(df_past["datetime"])
+    volume = df_past["volume"].to_numpy()[order]
+    if volume.dtype.kind == "f":
+        volume = np.nan_to_num(volume)
+    ends = np.append(starts[1:], len(order)) - 1
+    daily_residual = residual[order][ends]
+    return {
+        "company_code": comp_code,
+        "dates": dates,
+        "order": order,
+        "starts": starts,
+        "ends": ends,
+        "clean_series": clean_series[order],
+        "volume": volume,
+        "residual_mean": pd.Series(residual).mean(),
+        "residual_std": pd.Series(residual).std(),
+        "daily_residual": daily_residual[~np.isnan(daily_residual)],
+    }
+
+
+def get_MCPaths(base, close_noise):
+    """
+    Daily paths from the replication base and the noise of the last bar of each day (N_sims x len(dates)).
+    Only the close is noisy, open/high/low come from the clean series and are the same for every simulation.
+    """
+    clean_series, starts = base["clean_series"], base["starts"]
+    shape = close_noise.shape
+    ohlcv = {
+        "open": np.broadcast_to(clean_series[starts], shape),
+        "high": np.broadcast_to(np.fmax.reduceat(clean_series, starts), shape),
+        "low": np.broadcast_to(np.fmin.reduceat(clean_series, starts), shape),
+        "close": clean_series[base["ends"]] + close_noise,
+        "volume": np.broadcast_to(np.add.reduceat(base["volume"], starts), shape),
+    }
+    return MCPaths(base["company_code"], base["dates"], ohlcv)
+
+
+def get_sim_generators(seed, first: int, count: int):
+    """
+    One independent Generator per simulation index first..first + count - 1, the children of
+    SeedSequence(seed) with those spawn keys: simulation k draws the same numbers whether it runs
+    serially, in chunks or in any worker. seed: int, sequence of ints, SeedSequence or None (fresh entropy).
+    """
+    seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    entropy, spawn_key, pool_size = seed_seq.entropy, seed_seq.spawn_key, seed_seq.pool_size
+    return [
+        np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(*spawn_key, sim_k), pool_size=pool_size))
+        for sim_k in range(first, first + count)
+    ]
+
+
+def seed_key(seed):
+    """
+    Hashable form of a seed (see get_sim_generators) for the cached functions: None, or the
+    (entropy, spawn_key, pool_size) of its SeedSequence, equal for equal seeds.
+    """
+    if seed is None:
+        return None
+    seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    entropy = seed_seq.entropy
+    entropy = tuple(int(value) for value in entropy) if np.iterable(entropy) else int(entropy)
+    return entropy, tuple(seed_seq.spawn_key), seed_seq.pool_size
+
+
+def get_data_history_BackMC(comp_code, intraday_data, period, N_MC_Sims, seed=None, noise=None):
+    """
+    N_MC_Sims simulations (MCPaths) of the past of a company.
+    seed=None (and no noise model) draws from the global np.random state (as before), otherwise simulation k
+    uses its own stream (see get_sim_generators), same paths as iter_data_history_BackMC with that seed.
+    noise: NoiseModel of the daily close (src.noise), default GaussianNoise.
+    Cached by the value of the seed (see seed_key) and of the noise model.
+    """
+    return get_data_history_BackMC_cached(comp_code, intraday_data, period, N_MC_Sims, seed_key(seed), noise)
+
+
+@profiling.instrument("get_data_history_BackMC")
+@cache
+def get_data_history_BackMC_cached(comp_code, intraday_data, period, N_MC_Sims, seed_key=None, noise=None):
+    base = get_replication_base(comp_code, intraday_data, period)
+    if seed_key is not None or noise is not None:
+        noise = GaussianNoise() if noise is None else noise
+        seed = None
+        if seed_key is not None:
+            entropy, spawn_key, pool_size = seed_key
+            seed = np.random.SeedSequence(entropy, spawn_key=spawn_key, pool_size=pool_size)
+        return get_MCPaths(base, noise.sample(base, get_sim_generators(seed, 0, N_MC_Sims)))
+    # Generate random samples from a normal distribution with the same mean and standard deviation as the residual component.
+    random_samples = np.random.normal(
+        base["residual_mean"], base["residual_std"], size=(N_MC_Sims, len(base["clean_series"]))
+    )
+    # Add the random samples to the clean series to generate the Monte Carlo simulations.
+    return get_MCPaths(base, random_samples[:, base["order"][base["ends"]]])
+
+
+get_data_history_BackMC.cache_info = get_data_history_BackMC_cached.cache_info
+get_data_history_BackMC.cache_clear = get_data_history_BackMC_cached.cache_clear
+
 
-    df_past["close"] = clean_series.to_numpy()
-    df_past["close"].fillna(close.reset_index(drop=True))
-    df_past["close"] = df_past["close"].fillna(close.reset_index(drop=True))
-    for cols in ["high", "low", "open"]:
-        df_past[cols] = df_past["close"]
-
-    future_prev_list = []
-    for noisy in random_samples:
-        df = df_past.copy()
-        df["date"] = df["datetime"].dt.date
-        df["close"] = df["close"].to_numpy() + noisy
-        groupby_cols = ["company_code", "date"]
-        values_cols = {
-            "open": "first",
-            "high": "max",
-            "low": "min",
-            "close": "last",
-            "volume": "sum",
-        }
-        df = df.groupby(groupby_cols).agg(values_cols)
-        df.reset_index(inplace=True)
-        future_prev_list.append(df)
-
-    return future_prev_list
+def iter_data_history_BackMC(
+    comp_code, intraday_data, period, N_MC_Sims, chunk_size: int = 100, seed=None, first_sim: int = 0, noise=None
+):
+    """
+    Streaming get_data_history_BackMC: yields MCPaths of up to chunk_size simulations, so the memory
+    does not grow with N_MC_Sims. Simulation k has its own stream spawned from seed (see get_sim_generators),
+    so a shard (first_sim, first_sim + N_MC_Sims) gives the same paths as in a full run.
+    Only the noise of the last intraday bar of each day (the one the daily close keeps) is drawn,
+    from the noise model (src.noise, default GaussianNoise).
+    """
+    base = get_replication_base(comp_code, intraday_data, period)
+    noise = GaussianNoise() if noise is None else noise
+    seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    last = first_sim + N_MC_Sims
+    for first in range(first_sim, last, chunk_size):
+        generators = get_sim_generators(seed_seq, first, min(chunk_size, last - first))
+        with profiling.phase("iter_data_history_BackMC", len(generators) * len(base["dates"])):
+            paths = get_MCPaths(base, noise.sample(base, generators))
+        yield paths
 
 
 # EOF
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from hashlib import blake2b
+import numpy as np
+import pandas as pd
+from src import profiling
+
+
+def fingerprint(value):
+    """
+    Cheap hashable key of an indicator input: content digest of arrays/Series/DataFrames
+    (values and index), the value itself for scalars.
+    """
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return fingerprint(pd.Series(value.ravel()))
+        digest = blake2b(np.ascontiguousarray(value), digest_size=16).digest()
+        return value.shape, value.dtype.str, digest
+    if isinstance(value, pd.Index):
+        if isinstance(value, pd.RangeIndex):
+            return "range", value.start, value.stop, value.step
+        return "index", fingerprint(pd.util.hash_pandas_object(value, index=False).to_numpy())
+    if isinstance(value, pd.Series):
+        return "series", value.name, fingerprint(value.to_numpy()), fingerprint(value.index)
+    if isinstance(value, pd.DataFrame):
+        columns = tuple((col, fingerprint(value[col].to_numpy())) for col in value.columns)
+        return "frame", columns, fingerprint(value.index)
+    if isinstance(value, dict):
+        return "dict", tuple((key, fingerprint(val)) for key, val in value.items())
+    return value
+
+
+def sizeof(value):
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(val) for val in value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True))
+    return getattr(value, "nbytes", 0)
+
+
+class IndicatorCache:
+    """
+    LRU cache of indicator outputs, bounded by max_bytes.
+    key: (indicator qualified name, fingerprint of every argument), so the same indicator on the
+    same series with the same params is computed once, whatever strategy asks for it.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, func, *args):
+        func_name = getattr(func, "__func__", func).__qualname__
+        key = (func_name, *(fingerprint(arg) for arg in args))
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            if profiling.is_enabled():
+                profiling.record(f"indicator {func_name}", hit=True)
+            return self.entries[key][0]
+        self.misses += 1
+        with profiling.phase(f"indicator {func_name}", hit=False):
+            value = func(*args)
+        size = sizeof(value)
+        if size <= self.max_bytes:
+            self.entries[key] = value, size
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, size) = self.entries.popitem(last=False)
+                self.nbytes -= size
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "nbytes": self.nbytes}
+
+
+indicator_cache = IndicatorCache()
+
+
+# EOF
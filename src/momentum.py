@@ -17,43 +17,37 @@ class WilliansppR(AlgoTradeBase):
     def __init__(self, strategy_parameters):
         super().__init__(strategy_parameters)
 
-    @staticmethod
-    def get_wr(high, low, close, lookback):
-        highh = high.rolling(lookback).max()
-        lowl = low.rolling(lookback).min()
-        wr = -100 * ((highh - close) / (highh - lowl))
-        return wr
-
-    @staticmethod
-    def implement_wr_strategy(wr):
-        wr_signal = [0]
-        signal = 0
-        for i in range(1, len(wr)):
-            if wr[i - 1] > -80 and wr[i] < -80:
-                if signal != 1:
-                    signal = 1
-                    wr_signal.append(signal)
-                else:
-                    wr_signal.append(0)
-            elif wr[i - 1] < -20 and wr[i] > -20:
-                if signal != -1:
-                    signal = -1
-                    wr_signal.append(signal)
-                else:
-                    wr_signal.append(0)
-            else:
-                wr_signal.append(0)
-        return wr_signal
+    @classmethod
+    def implement_wr_strategy(cls, wr):
+        wr = np.asarray(wr, dtype=float)
+        wr_prev = cls.lag(wr)
+        return cls.state_signal((wr_prev > -80) & (wr < -80), (wr_prev < -20) & (wr > -20))
 
     def strategy(self, df_data, strategy_parameters):
         LOOKBACK_STRATEGY_PARAM = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
-        df_data["wr"] = self.get_wr(df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM)
+        df_data["wr"] = self.indicator(
+            self.get_wr, df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM
+        )
         df_data = self.fillna_with(df_data)
-        close = df_data["close"].to_list()
-        wr = df_data["wr"].to_list()
+        close = df_data["close"].to_numpy()
+        wr = df_data["wr"].to_numpy()
         wr_signal = self.implement_wr_strategy(wr)
         return wr_signal, close
 
+    def strategy_batch(self, paths, strategy_parameters):
+        LOOKBACK_STRATEGY_PARAM = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
+        high, low, close = (self.to_frame(paths[col]) for col in ["high", "low", "close"])
+        wr = self.indicator(self.get_wr, high, low, close, LOOKBACK_STRATEGY_PARAM).to_numpy().T
+        return self.implement_wr_strategy(wr), close.to_numpy().T
+
+    def strategy_sweep(self, df_data, lookbacks):
+        high, low, close = (df_data[col].to_numpy(dtype=float) for col in ["high", "low", "close"])
+        highh = self.rolling_extremum_sweep(high, lookbacks, np.maximum)
+        lowl = self.rolling_extremum_sweep(low, lookbacks, np.minimum)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            wr = -100 * ((highh - close) / (highh - lowl))
+        return self.implement_wr_strategy(wr), close
+
 
 ##########################################################################################
 #
@@ -74,35 +68,27 @@ class AwesomeOscillator(AlgoTradeBase):
         ao = short - long
         return ao
 
-    @staticmethod
-    def implement_ao_crossover(ao):
-        ao_signal = [0]
-        signal = 0
-        for i in range(1, len(ao)):
-            if ao[i] > 0 and ao[i - 1] < 0:
-                if signal != 1:
-                    signal = 1
-                    ao_signal.append(signal)
-                else:
-                    ao_signal.append(0)
-            elif ao[i] < 0 and ao[i - 1] > 0:
-                if signal != -1:
-                    signal = -1
-                    ao_signal.append(signal)
-                else:
-                    ao_signal.append(0)
-            else:
-                ao_signal.append(0)
-        return ao_signal
+    @classmethod
+    def implement_ao_crossover(cls, ao):
+        ao = np.asarray(ao, dtype=float)
+        ao_prev = cls.lag(ao)
+        return cls.state_signal((ao > 0) & (ao_prev < 0), (ao < 0) & (ao_prev > 0))
 
     def strategy(self, df_data, strategy_parameters):
         short_period = strategy_parameters["short_period"]
         long_period = strategy_parameters["long_period"]
 
-        df_data["ao"] = self.get_ao(df_data["close"], short_period, long_period)
+        df_data["ao"] = self.indicator(self.get_ao, df_data["close"], short_period, long_period)
         df_data = self.fillna_with(df_data)
-        ao_signal = self.implement_ao_crossover(df_data["ao"].to_list())
-        return ao_signal, df_data["close"].to_list()
+        ao_signal = self.implement_ao_crossover(df_data["ao"].to_numpy())
+        return ao_signal, df_data["close"].to_numpy()
+
+    def strategy_batch(self, paths, strategy_parameters):
+        short_period = strategy_parameters["short_period"]
+        long_period = strategy_parameters["long_period"]
+        close = self.to_frame(paths["close"])
+        ao = self.indicator(self.get_ao, close, short_period, long_period).to_numpy().T
+        return self.implement_ao_crossover(ao), close.to_numpy().T
 
 
 ##########################################################################################
@@ -121,39 +107,42 @@ class CommodityChannelIndex(AlgoTradeBase):
         df_tmp = type(df)()
         df_tmp["pt"] = (df["high"] + df["low"] + df["close"]) / 3
         df_tmp["sma_pt"] = self.sma(df_tmp["pt"], n)
-        df_tmp["mad_pt"] = df["close"].rolling(n).apply(self.mad)
+        df_tmp["mad_pt"] = self.rolling_mad(df["close"], n)
         return (df_tmp["pt"] - df_tmp["sma_pt"]) / (0.015 * df_tmp["mad_pt"])
 
-    @staticmethod
-    def implement_cci_strategy(prices, cci):
-        cci_signal = [0]
-        signal = 0
+    @classmethod
+    def implement_cci_strategy(cls, prices, cci):
         lower_band = -150
         upper_band = 150
-        for i in range(1, len(prices)):
-            if cci[i - 1] > lower_band and cci[i] < lower_band:
-                if signal != 1:
-                    signal = 1
-                    cci_signal.append(signal)
-                else:
-                    cci_signal.append(0)
-            elif cci[i - 1] < upper_band and cci[i] > upper_band:
-                if signal != -1:
-                    signal = -1
-                    cci_signal.append(signal)
-                else:
-                    cci_signal.append(0)
-            else:
-                cci_signal.append(0)
-        return cci_signal
+        cci = np.asarray(cci, dtype=float)[..., : np.shape(prices)[-1]]
+        cci_prev = cls.lag(cci)
+        return cls.state_signal(
+            (cci_prev > lower_band) & (cci < lower_band), (cci_prev < upper_band) & (cci > upper_band)
+        )
 
     def strategy(self, df, strategy_parameters):
         LOOKBACK_STRATEGY_PARAM = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
         df_data = df.copy()
-        df_data["cci"] = self.get_cci(df_data, LOOKBACK_STRATEGY_PARAM)
+        df_data["cci"] = self.indicator(self.get_cci, df_data[["high", "low", "close"]], LOOKBACK_STRATEGY_PARAM)
         df_data = self.fillna_with(df_data)
-        cci_signal = self.implement_cci_strategy(df_data["close"].to_list(), df_data["cci"].to_list())
-        return cci_signal, df_data["close"].to_list()
+        cci_signal = self.implement_cci_strategy(df_data["close"].to_numpy(), df_data["cci"].to_numpy())
+        return cci_signal, df_data["close"].to_numpy()
+
+    def strategy_batch(self, paths, strategy_parameters):
+        LOOKBACK_STRATEGY_PARAM = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
+        df_data = {col: self.to_frame(paths[col]) for col in ["high", "low", "close"]}
+        cci = self.indicator(self.get_cci, df_data, LOOKBACK_STRATEGY_PARAM).to_numpy().T
+        close = df_data["close"].to_numpy().T
+        return self.implement_cci_strategy(close, cci), close
+
+    def strategy_sweep(self, df_data, lookbacks):
+        close = df_data["close"].to_numpy(dtype=float)
+        pt = (df_data["high"].to_numpy(dtype=float) + df_data["low"].to_numpy(dtype=float) + close) / 3
+        sma_pt = self.sma_sweep(pt, lookbacks)
+        mad_pt = np.array([self.rolling_mad(df_data["close"], n).to_numpy() for n in lookbacks])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cci = (pt - sma_pt) / (0.015 * mad_pt)
+        return self.implement_cci_strategy(close, cci), close
 
 
 ##########################################################################################
@@ -175,12 +164,14 @@ class CoppockCurve(AlgoTradeBase):
     def __init__(self, strategy_parameters):
         super().__init__(strategy_parameters)
 
-    @staticmethod
-    def wma(data, lookback):
+    @classmethod
+    def wma(cls, data, lookback):
+        """
+        Weighted moving average (weights 1..lookback), NaN in the first lookback - 1 bars and
+        in any window with a NaN, as data.rolling(lookback). data: Series or T x N_sims DataFrame.
+        """
         weights = np.arange(1, lookback + 1)
-        val = data.rolling(lookback)
-        wma = val.apply(lambda prices: np.dot(prices, weights) / weights.sum(), raw=True)
-        return wma
+        return cls.rolling_windows(data, lookback, lambda windows: windows @ weights / weights.sum())
 
     @staticmethod
     def get_roc(close, n):
@@ -196,28 +187,14 @@ class CoppockCurve(AlgoTradeBase):
         cc = self.wma(ROC, wma_lookback)
         return cc
 
-    @staticmethod
-    def implement_cc_strategy(prices, cc):
-        signal = 1
-        cc_signal = [1]
-        for i in range(1, 4):
-            cc_signal.append(0)
-        for i in range(4, len(prices)):
-            if cc[i - 4] < 0 and cc[i - 3] < 0 and cc[i - 2] < 0 and cc[i - 1] < 0 and cc[i] > 0:
-                if signal != 1:
-                    signal = 1
-                    cc_signal.append(signal)
-                else:
-                    cc_signal.append(0)
-            elif cc[i - 4] > 0 and cc[i - 3] > 0 and cc[i - 2] > 0 and cc[i - 1] > 0 and cc[i] < 0:
-                if signal != -1:
-                    signal = -1
-                    cc_signal.append(signal)
-                else:
-                    cc_signal.append(0)
-            else:
-                cc_signal.append(0)
-
+    @classmethod
+    def implement_cc_strategy(cls, prices, cc):
+        cc = np.asarray(cc, dtype=float)[..., : np.shape(prices)[-1]]
+        cc_prev = [cls.lag(cc, n) for n in range(1, 5)]
+        enter = (cc > 0) & np.logical_and.reduce([prev < 0 for prev in cc_prev])
+        exit = (cc < 0) & np.logical_and.reduce([prev > 0 for prev in cc_prev])
+        cc_signal = cls.state_signal(enter, exit, initial=1)
+        cc_signal[..., :1] = 1
         return cc_signal
 
     def strategy(self, df, strategy_parameters):
@@ -227,9 +204,17 @@ class CoppockCurve(AlgoTradeBase):
         lookbackWMA = lookbackWMA if lookbackWMA is not None else shortROC + (shortROC + longROC) // 2
 
         df_data = df.copy()
-        df_data["cc"] = self.get_cc(df_data["close"], shortROC, longROC, 10)
+        df_data["cc"] = self.indicator(self.get_cc, df_data["close"], shortROC, longROC, 10)
         df_data = self.fillna_with(df_data)
-        return self.implement_cc_strategy(df_data["close"], df_data["cc"]), df_data["close"].to_list()
+        return self.implement_cc_strategy(df_data["close"], df_data["cc"]), df_data["close"].to_numpy()
+
+    def strategy_batch(self, paths, strategy_parameters):
+        shortROC = strategy_parameters["shortROC"]
+        longROC = strategy_parameters["longROC"]
+        close = self.to_frame(paths["close"])
+        cc = self.indicator(self.get_cc, close, shortROC, longROC, 10).to_numpy().T
+        close = close.to_numpy().T
+        return self.implement_cc_strategy(close, cc), close
 
 
 ##########################################################################################
@@ -249,39 +234,32 @@ class MACD(AlgoTradeBase):
     def __init__(self, strategy_parameters):
         super().__init__(strategy_parameters)
 
-    @staticmethod
-    def implement_macd_strategy(macd, input_signal):
-        macd_signal = []
-        signal = 0
-        for i in range(len(macd)):
-            if macd[i] > input_signal[i]:
-                if signal != 1:
-                    signal = 1
-                    macd_signal.append(signal)
-                else:
-                    macd_signal.append(0)
-            elif macd[i] < input_signal[i]:
-                if signal != -1:
-                    signal = -1
-                    macd_signal.append(signal)
-                else:
-                    macd_signal.append(0)
-            else:
-                macd_signal.append(0)
-        return macd_signal
+    @classmethod
+    def implement_macd_strategy(cls, macd, input_signal):
+        macd, input_signal = np.asarray(macd, dtype=float), np.asarray(input_signal, dtype=float)
+        return cls.state_signal(macd > input_signal, macd < input_signal)
 
     def strategy(self, df_data, strategy_parameters):
         slow = strategy_parameters.get("SLOW", 26)
         fast = strategy_parameters.get("FAST", 12)
         smooth = strategy_parameters.get("SMOOTH", 9)
-        macd, macd_signal, hist = self.get_macd(df_data["close"], slow, fast, smooth)
+        macd, macd_signal, hist = self.indicator(self.get_macd, df_data["close"], slow, fast, smooth)
         df_data["macd"] = macd
         df_data["macd_signal"] = macd_signal
         df_data["macd_hist"] = hist
         df_data = df_data.fillna(0)
-        close = df_data["close"].to_list()
-        wr_signal = self.implement_macd_strategy(df_data["macd"].to_list(), df_data["macd_signal"].to_list())
+        close = df_data["close"].to_numpy()
+        wr_signal = self.implement_macd_strategy(df_data["macd"].to_numpy(), df_data["macd_signal"].to_numpy())
         return wr_signal, close
 
+    def strategy_batch(self, paths, strategy_parameters):
+        slow = strategy_parameters.get("SLOW", 26)
+        fast = strategy_parameters.get("FAST", 12)
+        smooth = strategy_parameters.get("SMOOTH", 9)
+        close = self.to_frame(paths["close"])
+        macd, macd_signal = self.indicator(self.get_macd_batch, close, slow, fast, smooth)
+        macd, macd_signal = np.nan_to_num(macd, nan=0.0), np.nan_to_num(macd_signal, nan=0.0)
+        return self.implement_macd_strategy(macd, macd_signal), close.to_numpy().T
+
 
 # EOF
@@ -0,0 +1,153 @@
+import json
+import numpy as np
+import pandas as pd
+from src.helpers import get_data_history, iter_data_history_BackMC
+from src.runner import STRATEGIES, expand_params, mix_seed
+
+
+class RunningStats:
+    """
+    Running mean/variance of the final budget M (batch merge of Welford's algorithm)
+    and total wins/losses, updated one batch of simulations at a time.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.wins = 0
+        self.losses = 0
+
+    def update(self, M, wins, losses):
+        M = np.asarray(M, dtype=float)
+        n = len(M)
+        if n == 0:
+            return
+        mean = M.mean()
+        delta = mean - self.mean
+        total = self.n + n
+        self.mean += delta * n / total
+        self.M2 += ((M - mean) ** 2).sum() + delta**2 * self.n * n / total
+        self.n = total
+        self.wins += int(np.sum(wins))
+        self.losses += int(np.sum(losses))
+
+    @property
+    def var(self):
+        return self.M2 / (self.n - 1) if self.n > 1 else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    @property
+    def win_rate(self):
+        operations = self.wins + self.losses
+        return self.wins / operations if operations else np.nan
+
+    def half_width(self, z: float = 1.96):
+        """
+        Half width of the (normal approximation) confidence interval of the mean of M.
+        """
+        return z * self.std / np.sqrt(self.n) if self.n > 1 else np.inf
+
+    def ci(self, z: float = 1.96):
+        half_width = self.half_width(z)
+        return self.mean - half_width, self.mean + half_width
+
+    def __repr__(self):
+        return f"RunningStats(n={self.n}, mean={self.mean}, std={self.std}, wins={self.wins}, losses={self.losses})"
+
+
+def get_key(algo):
+    return algo.__class__.__name__, json.dumps(algo.strategy_parameters)
+
+
+def reduce_BackMC(
+    algos, comp_code, intraday_data, period, N_MC_Sims, chunk_size: int = 100, seed=None, noise=None
+):
+    """
+    Runs every algo over the simulations of iter_data_history_BackMC, chunk by chunk, keeping only
+    running statistics, so the peak memory does not depend on N_MC_Sims.
+    noise: NoiseModel of the simulations (src.noise), default GaussianNoise.
+    output: {(strategy name, json params): RunningStats}
+    """
+    stats = {get_key(algo): RunningStats() for algo in algos}
+    simulations = iter_data_history_BackMC(comp_code, intraday_data, period, N_MC_Sims, chunk_size, seed, noise=noise)
+    for paths in simulations:
+        for algo in algos:
+            stats[get_key(algo)].update(*algo.apply_strategy_batch(paths.ohlcv, 1.0))
+    return stats
+
+
+def adaptive_BackMC(
+    algos,
+    comp_code,
+    intraday_data,
+    period,
+    max_sims: int = 1000,
+    batch_size: int = 10,
+    min_sims: int = 20,
+    tol: float = 0.005,
+    z: float = 1.96,
+    seed: int = 0,
+    noise=None,
+):
+    """
+    reduce_BackMC with early stopping: the simulations run in batches of batch_size (every algo on the
+    same paths) and, after min_sims, an algo stops sampling once the confidence interval of its mean M is
+    narrower than +/- tol (M_initial = 1) or once it is below the interval of the best algo of the group.
+    Sampling ends when every algo stopped or after max_sims. The seed is mixed with the ticker/period
+    (as in the grid runner), so every ticker/period draws its own reproducible paths.
+    output: {(strategy name, json params): RunningStats}, {same key: "converged" | "dominated" | "max_sims"}
+    """
+    algos = {get_key(algo): algo for algo in algos}
+    stats = {key: RunningStats() for key in algos}
+    stopped = {}
+    seed = mix_seed(comp_code, period, seed)
+    simulations = iter_data_history_BackMC(comp_code, intraday_data, period, max_sims, batch_size, seed, noise=noise)
+    for paths in simulations:
+        for key, algo in algos.items():
+            if key not in stopped:
+                stats[key].update(*algo.apply_strategy_batch(paths.ohlcv, 1.0))
+        best_low = max(stat.ci(z)[0] for stat in stats.values())
+        for key, stat in stats.items():
+            if key in stopped or stat.n < min_sims:
+                continue
+            if stat.half_width(z) <= tol:
+                stopped[key] = "converged"
+            elif stat.ci(z)[1] < best_low:
+                stopped[key] = "dominated"
+        if len(stopped) == len(algos):
+            simulations.close()
+            break
+    return stats, {key: stopped.get(key, "max_sims") for key in algos}
+
+
+def run_adaptive_grid(strategies_params, comp_codes, intraday_data, periods=("1st", "2nd", "year"), **kwargs):
+    """
+    adaptive_BackMC over the period x ticker grid, each ticker/period is a group of every strategy/params.
+    output: DataFrame, one row per (period, ticker, strategy, params) with the number of simulations run,
+    the mean/std/confidence interval of M, wins/losses and why the sampling stopped.
+    """
+    z = kwargs.get("z", 1.96)
+    run_params = expand_params(strategies_params)
+    rows = []
+    for period in periods:
+        for comp_code in comp_codes:
+            _, df_future = get_data_history(comp_code, intraday_data, period)
+            if df_future.empty:
+                continue
+            algos = [STRATEGIES[strategy](params) for strategy, params in run_params]
+            stats, stopped = adaptive_BackMC(algos, comp_code, intraday_data, period, **kwargs)
+            for (strategy, params), stat in stats.items():
+                M_low, M_high = stat.ci(z)
+                rows.append(
+                    [period, comp_code, strategy, params, stat.n, stat.mean, stat.std, M_low, M_high]
+                    + [stat.wins, stat.losses, stopped[strategy, params]]
+                )
+    columns = ["period", "comp_code", "strategy", "params", "n_sims", "M_mean", "M_std", "M_low", "M_high"]
+    return pd.DataFrame(rows, columns=columns + ["wins", "losses", "stop"])
+
+
+# EOF
@@ -0,0 +1,142 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class NoiseModel(ABC):
+    """
+    Noise of the daily close of the Monte Carlo simulations, fitted on the replication base
+    (see helpers.get_replication_base). sample(base, generators): N_sims x len(base["dates"]) noise,
+    row k drawn only from generators[k] (the stream of simulation k), the paths are computed in batch.
+    Models with the same type and parameters are equal (and hash the same), for the cached helpers.
+    """
+
+    @abstractmethod
+    def sample(self, base, generators):
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return type(self) is type(other) and vars(self) == vars(other)
+
+    def __hash__(self):
+        return hash((type(self), tuple(sorted(vars(self).items()))))
+
+    @staticmethod
+    def standard_normal(generators, size):
+        return np.array([rng.standard_normal(size) for rng in generators]).reshape(len(generators), size)
+
+
+class GaussianNoise(NoiseModel):
+    """
+    i.i.d. normal noise with the mean and standard deviation of the residual (the default).
+    """
+
+    def sample(self, base, generators):
+        size = len(base["dates"])
+        noise = [rng.normal(base["residual_mean"], base["residual_std"], size=size) for rng in generators]
+        return np.array(noise).reshape(len(generators), size)
+
+
+class BlockBootstrap(NoiseModel):
+    """
+    Moving block bootstrap of the daily residuals: blocks of block_size consecutive residuals,
+    starting at uniform positions, keep their short-range dependence.
+    """
+
+    def __init__(self, block_size: int = 5):
+        self.block_size = block_size
+
+    def sample(self, base, generators):
+        residual = base["daily_residual"]
+        size = len(base["dates"])
+        block_size = max(1, min(self.block_size, len(residual)))
+        n_blocks = -(-size // block_size)
+        starts = np.array([rng.integers(0, len(residual) - block_size + 1, n_blocks) for rng in generators])
+        index = (starts.reshape(len(generators), n_blocks, 1) + np.arange(block_size)).reshape(len(generators), -1)
+        return residual[index[:, :size]]
+
+
+class StationaryBootstrap(NoiseModel):
+    """
+    Stationary bootstrap (Politis & Romano) of the daily residuals: blocks of geometric length
+    (mean mean_block_size) wrapping around the end of the series.
+    """
+
+    def __init__(self, mean_block_size: float = 5.0):
+        self.mean_block_size = mean_block_size
+
+    def sample(self, base, generators):
+        residual = base["daily_residual"]
+        size = len(base["dates"])
+        draws = [(rng.random(size), rng.integers(0, len(residual), size)) for rng in generators]
+        uniform = np.array([u for u, _ in draws]).reshape(len(generators), size)
+        starts = np.array([s for _, s in draws]).reshape(len(generators), size)
+        new_block = uniform < 1 / self.mean_block_size
+        new_block[:, 0] = True
+        steps = np.arange(size)
+        block_first = np.maximum.accumulate(np.where(new_block, steps, 0), axis=1)
+        index = (np.take_along_axis(starts, block_first, axis=1) + steps - block_first) % len(residual)
+        return residual[index]
+
+
+class AR1Noise(NoiseModel):
+    """
+    Gaussian AR(1) noise, x_t = mean + phi * (x_t-1 - mean) + e_t, with the mean and variance of the
+    residual. phi: None fits it as the lag-1 autocorrelation of the daily residuals.
+    """
+
+    def __init__(self, phi: float = None):
+        self.phi = phi
+
+    def get_phi(self, base):
+        if self.phi is not None:
+            return self.phi
+        residual = base["daily_residual"]
+        if len(residual) < 3:
+            return 0.0
+        return float(np.clip(np.corrcoef(residual[1:], residual[:-1])[0, 1], -0.99, 0.99))
+
+    def sample(self, base, generators):
+        phi = self.get_phi(base)
+        shocks = self.standard_normal(generators, len(base["dates"])) * base["residual_std"]
+        shocks[:, 1:] *= np.sqrt(1 - phi**2)
+        noise = np.empty_like(shocks)
+        if noise.shape[1]:
+            noise[:, 0] = shocks[:, 0]
+        for t in range(1, noise.shape[1]):
+            noise[:, t] = phi * noise[:, t - 1] + shocks[:, t]
+        return noise + base["residual_mean"]
+
+
+class GARCHNoise(NoiseModel):
+    """
+    GARCH(1,1) noise, variance_t = omega + alpha * e_t-1 ** 2 + beta * variance_t-1, omega so that the
+    unconditional variance is the residual variance (alpha + beta < 1), plus the residual mean.
+    """
+
+    def __init__(self, alpha: float = 0.1, beta: float = 0.85):
+        if alpha < 0 or beta < 0 or alpha + beta >= 1:
+            raise ValueError("GARCH(1,1) needs alpha, beta >= 0 and alpha + beta < 1")
+        self.alpha = alpha
+        self.beta = beta
+
+    def sample(self, base, generators):
+        variance = base["residual_std"] ** 2
+        omega = variance * (1 - self.alpha - self.beta)
+        shocks = self.standard_normal(generators, len(base["dates"]))
+        noise = np.empty_like(shocks)
+        conditional = np.full(len(shocks), variance)
+        previous = np.zeros(len(shocks))
+        for t in range(shocks.shape[1]):
+            if t:
+                conditional = omega + self.alpha * previous**2 + self.beta * conditional
+            previous = noise[:, t] = np.sqrt(conditional) * shocks[:, t]
+        return noise + base["residual_mean"]
+
+
+NOISE_MODELS = {
+    class_obj.__name__: class_obj
+    for class_obj in [GaussianNoise, BlockBootstrap, StationaryBootstrap, AR1Noise, GARCHNoise]
+}
+
+
+# EOF
@@ -0,0 +1,76 @@
+import pandas as pd
+from src.helpers import get_data_history, iter_data_history_BackMC
+from src.montecarlo import RunningStats, get_key
+from src.runner import STRATEGIES, expand_params, mix_seed
+
+
+def successive_halving(
+    algos,
+    comp_code,
+    intraday_data,
+    period,
+    N_MC_Sims: int = 100,
+    min_sims: int = 10,
+    eta: int = 2,
+    seed: int = 0,
+    chunk_size: int = 100,
+    noise=None,
+):
+    """
+    Successive halving of the algos of one ticker/period over the simulations of the grid runner
+    (same seed, same paths): every algo runs on the first min_sims simulations, the best 1/eta by mean M
+    go on with eta times more simulations, ..., until the survivors ran all N_MC_Sims.
+    The winner is the top-1 of the full grid (max. sum of M_past over the N_MC_Sims simulations) unless it
+    was dropped in an early round.
+    output: [((strategy name, json params), RunningStats)], the last round first, best mean M first.
+    """
+    algos = {get_key(algo): algo for algo in algos}
+    stats = {key: RunningStats() for key in algos}
+    seed = mix_seed(comp_code, period, seed)
+    survivors = list(algos)
+    ranking = []
+    done = 0
+    n_sims = min(min_sims, N_MC_Sims)
+    while True:
+        simulations = iter_data_history_BackMC(
+            comp_code, intraday_data, period, n_sims - done, chunk_size, seed, first_sim=done, noise=noise
+        )
+        for paths in simulations:
+            for key in survivors:
+                stats[key].update(*algos[key].apply_strategy_batch(paths.ohlcv, 1.0))
+        done = n_sims
+        survivors.sort(key=lambda key: stats[key].mean, reverse=True)
+        if done >= N_MC_Sims:
+            break
+        n_keep = max(1, -(-len(survivors) // eta))
+        ranking = survivors[n_keep:] + ranking
+        survivors = survivors[:n_keep]
+        n_sims = min(n_sims * eta, N_MC_Sims)
+    return [(key, stats[key]) for key in survivors + ranking]
+
+
+def optimize_grid(strategies_params, comp_codes, intraday_data, periods=("1st", "2nd", "year"), **kwargs):
+    """
+    successive_halving over the period x ticker grid: the best strategy/params of each ticker/period,
+    as the top-1 (by M_past) of the ranking step of the notebook.
+    output: DataFrame with period, comp_code, strategy, params, M_past, L_past, W_past (sums over the
+    simulations, as df.groupby(hash_cols).sum() of the run_grid results) and the number of strategy runs
+    (simulations x strategy/params) it took.
+    """
+    run_params = expand_params(strategies_params)
+    rows = []
+    for period in periods:
+        for comp_code in comp_codes:
+            _, df_future = get_data_history(comp_code, intraday_data, period)
+            if df_future.empty:
+                continue
+            algos = [STRATEGIES[strategy](params) for strategy, params in run_params]
+            ranking = successive_halving(algos, comp_code, intraday_data, period, **kwargs)
+            (strategy, params), best = ranking[0]
+            runs = sum(stat.n for _, stat in ranking)
+            rows.append([period, comp_code, strategy, params, best.mean * best.n, best.wins, best.losses, runs])
+    columns = ["period", "comp_code", "strategy", "params", "M_past", "L_past", "W_past", "runs"]
+    return pd.DataFrame(rows, columns=columns)
+
+
+# EOF
@@ -2,6 +2,11 @@ from src.algotradebase import AlgoTradeBase
 import pandas as pd
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:  # optional, supertrend_kernel_numpy is used instead
+    njit = None
+
 
 class SMA(AlgoTradeBase):
     """
@@ -14,35 +19,91 @@ class SMA(AlgoTradeBase):
     def __init__(self, strategy_parameters):
         super().__init__(strategy_parameters)
 
-    @staticmethod
-    def sma_strategy(short_window, long_window):
-        sma1 = short_window
-        sma2 = long_window
-        sma_signal = []
-        signal = 0
-        for i in range(len(short_window)):
-            if sma1[i] > sma2[i]:
-                if signal != 1:
-                    signal = 1
-                    sma_signal.append(signal)
-                else:
-                    sma_signal.append(0)
-            elif sma2[i] > sma1[i]:
-                if signal != -1:
-                    signal = -1
-                    sma_signal.append(-1)
-                else:
-                    sma_signal.append(0)
-            else:
-                sma_signal.append(0)
-        return sma_signal
+    @classmethod
+    def sma_strategy(cls, short_window, long_window):
+        sma1 = np.asarray(short_window, dtype=float)
+        sma2 = np.asarray(long_window, dtype=float)
+        return cls.state_signal(sma1 > sma2, sma2 > sma1)
 
     def strategy(self, df_data, strategy_parameters):
         SHORT_WINDOW = strategy_parameters["SHORT_WINDOW"]
         LONG_WINDOW = strategy_parameters["LONG_WINDOW"]
-        short_window = self.sma(df_data["close"], SHORT_WINDOW).to_list()
-        long_window = self.sma(df_data["close"], LONG_WINDOW).to_list()
-        return self.sma_strategy(short_window, long_window), df_data["close"].to_list()
+        short_window = self.indicator(self.sma, df_data["close"], SHORT_WINDOW).to_numpy()
+        long_window = self.indicator(self.sma, df_data["close"], LONG_WINDOW).to_numpy()
+        return self.sma_strategy(short_window, long_window), df_data["close"].to_numpy()
+
+    def strategy_batch(self, paths, strategy_parameters):
+        SHORT_WINDOW = strategy_parameters["SHORT_WINDOW"]
+        LONG_WINDOW = strategy_parameters["LONG_WINDOW"]
+        close = self.to_frame(paths["close"])
+        short_window = self.indicator(self.sma, close, SHORT_WINDOW).to_numpy().T
+        long_window = self.indicator(self.sma, close, LONG_WINDOW).to_numpy().T
+        return self.sma_strategy(short_window, long_window), close.to_numpy().T
+
+
+def supertrend_kernel_numpy(upper_band, lower_band, close):
+    """
+    Final upper/lower bands and supertrend recursion, one pass over T for all the paths at once.
+    input: basic bands and close, N_paths x T arrays.
+    """
+    final_upper = np.zeros_like(upper_band)
+    final_lower = np.zeros_like(lower_band)
+    supertrend = np.zeros_like(close)
+    for i in range(1, close.shape[1]):
+        upper_prev, lower_prev = final_upper[:, i - 1], final_lower[:, i - 1]
+        upper = np.where(
+            (upper_band[:, i] < upper_prev) | (close[:, i - 1] > upper_prev), upper_band[:, i], upper_prev
+        )
+        lower = np.where(
+            (lower_band[:, i] > lower_prev) | (close[:, i - 1] < lower_prev), lower_band[:, i], lower_prev
+        )
+        on_upper = supertrend[:, i - 1] == upper_prev
+        on_lower = supertrend[:, i - 1] == lower_prev
+        supertrend[:, i] = np.select(
+            [
+                on_upper & (close[:, i] < upper),
+                on_upper & (close[:, i] > upper),
+                on_lower & (close[:, i] > lower),
+                on_lower & (close[:, i] < lower),
+            ],
+            [upper, lower, lower, upper],
+            0.0,
+        )
+        final_upper[:, i], final_lower[:, i] = upper, lower
+    return final_upper, final_lower, supertrend
+
+
+def supertrend_kernel_loop(upper_band, lower_band, close):
+    """
+    Same as supertrend_kernel_numpy, scalar loops to be compiled by Numba.
+    """
+    final_upper = np.zeros_like(upper_band)
+    final_lower = np.zeros_like(lower_band)
+    supertrend = np.zeros_like(close)
+    for n in range(close.shape[0]):
+        for i in range(1, close.shape[1]):
+            upper_prev, lower_prev = final_upper[n, i - 1], final_lower[n, i - 1]
+            if upper_band[n, i] < upper_prev or close[n, i - 1] > upper_prev:
+                final_upper[n, i] = upper_band[n, i]
+            else:
+                final_upper[n, i] = upper_prev
+            if lower_band[n, i] > lower_prev or close[n, i - 1] < lower_prev:
+                final_lower[n, i] = lower_band[n, i]
+            else:
+                final_lower[n, i] = lower_prev
+            upper, lower, st_prev, price = final_upper[n, i], final_lower[n, i], supertrend[n, i - 1], close[n, i]
+            if st_prev == upper_prev and price < upper:
+                supertrend[n, i] = upper
+            elif st_prev == upper_prev and price > upper:
+                supertrend[n, i] = lower
+            elif st_prev == lower_prev and price > lower:
+                supertrend[n, i] = lower
+            elif st_prev == lower_prev and price < lower:
+                supertrend[n, i] = upper
+    return final_upper, final_lower, supertrend
+
+
+supertrend_kernel = supertrend_kernel_numpy if njit is None else njit(cache=True)(supertrend_kernel_loop)
 
 
 class SuperTrend(AlgoTradeBase):
@@ -57,7 +118,35 @@ class SuperTrend(AlgoTradeBase):
         super().__init__(strategy_parameters)
 
     @staticmethod
-    def get_supertrend(high, low, close, lookback, multiplier):
+    def get_bands(high, low, close, lookback, multiplier):
+        """
+        Basic upper and lower bands, high/low/close: Series or T x N_paths DataFrames.
+        """
+        prev_close = close.shift(1)
+        tr = np.fmax(np.fmax(high - low, abs(high - prev_close)), abs(low - prev_close))
+        atr = tr.ewm(lookback).mean()
+        hl_avg = (high + low) / 2
+        return hl_avg + multiplier * atr, hl_avg - multiplier * atr
+
+    @classmethod
+    def get_supertrend(cls, high, low, close, lookback, multiplier):
+        upper_band, lower_band = cls.get_bands(high, low, close, lookback, multiplier)
+        _, _, supertrend = supertrend_kernel(
+            upper_band.to_numpy(dtype=float)[None, :],
+            lower_band.to_numpy(dtype=float)[None, :],
+            close.to_numpy(dtype=float)[None, :],
+        )
+        st = pd.Series(supertrend[0, 1:], index=upper_band.index[1:], name=f"supertrend_{lookback}")
+        price = close.to_numpy()[1:]
+        upt = st.where(price > st)
+        dt = st.where(price < st)
+        return st, upt, dt
+
+    @staticmethod
+    def get_supertrend_loop(high, low, close, lookback, multiplier):
+        """
+        Reference (cell by cell) implementation of get_supertrend, see benchmarks/parity.py check_supertrend.
+        """
         # ATR
         tr1 = pd.DataFrame(high - low)
         tr2 = pd.DataFrame(abs(high - close.shift(1)))
@@ -126,35 +215,41 @@ class SuperTrend(AlgoTradeBase):
         upt.index, dt.index = supertrend.index, supertrend.index
         return st, upt, dt
 
-    @staticmethod
-    def st_strategy(prices, st):
-        st_signal = [0]
-        signal = 0
-        for i in range(1, len(st)):
-            if st[i - 1] > prices[i - 1] and st[i] < prices[i]:
-                if signal != 1:
-                    signal = 1
-                    st_signal.append(signal)
-                else:
-                    st_signal.append(0)
-            elif st[i - 1] < prices[i - 1] and st[i] > prices[i]:
-                if signal != -1:
-                    signal = -1
-                    st_signal.append(signal)
-                else:
-                    st_signal.append(0)
-            else:
-                st_signal.append(0)
-        return st_signal
+    @classmethod
+    def st_strategy(cls, prices, st):
+        prices, st = np.asarray(prices, dtype=float), np.asarray(st, dtype=float)
+        prices_prev, st_prev = cls.lag(prices), cls.lag(st)
+        return cls.state_signal((st_prev > prices_prev) & (st < prices), (st_prev < prices_prev) & (st > prices))
 
     def strategy(self, df_data, strategy_parameters):
         LOOKBACK_STRATEGY_PARAM = strategy_parameters.get("LOOKBACK_STRATEGY_PARAM", 10)
         MULTIPLIER = strategy_parameters.get("MULTIPLIER", 3)
-        df_data["st"], df_data["s_upt"], df_data["st_dt"] = self.get_supertrend(
-            df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM, MULTIPLIER
+        df_data["st"], df_data["s_upt"], df_data["st_dt"] = self.indicator(
+            self.get_supertrend, df_data["high"], df_data["low"], df_data["close"], LOOKBACK_STRATEGY_PARAM, MULTIPLIER
         )
         df_data = df_data[1:].reset_index(drop=True)
-        return self.st_strategy(df_data["close"], df_data["st"]), df_data["close"].to_list()
+        return self.st_strategy(df_data["close"], df_data["st"]), df_data["close"].to_numpy()
+
+    def strategy_batch(self, paths, strategy_parameters):
+        LOOKBACK_STRATEGY_PARAM = strategy_parameters.get("LOOKBACK_STRATEGY_PARAM", 10)
+        MULTIPLIER = strategy_parameters.get("MULTIPLIER", 3)
+        high, low, close = (self.to_frame(paths[col]) for col in ["high", "low", "close"])
+        upper_band, lower_band = self.indicator(self.get_bands, high, low, close, LOOKBACK_STRATEGY_PARAM, MULTIPLIER)
+        close = close.to_numpy().T
+        _, _, st = supertrend_kernel(upper_band.to_numpy().T.copy(), lower_band.to_numpy().T.copy(), close.copy())
+        st, close = st[:, 1:], close[:, 1:]
+        return self.st_strategy(close, st), close
+
+    def strategy_sweep(self, df_data, lookbacks):
+        MULTIPLIER = self.strategy_parameters.get("MULTIPLIER", 3)
+        high, low, close = (df_data[col].to_numpy(dtype=float) for col in ["high", "low", "close"])
+        prev_close = self.lag(close)
+        tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+        atr = self.ewm_mean(np.broadcast_to(tr, (len(lookbacks), len(tr))), lookbacks)
+        hl_avg = (high + low) / 2
+        close_rows = np.repeat(close[None, :], len(lookbacks), axis=0)
+        _, _, st = supertrend_kernel(hl_avg + MULTIPLIER * atr, hl_avg - MULTIPLIER * atr, close_rows)
+        return self.st_strategy(close[1:], st[:, 1:]), close[1:]
 
 
 # EOF
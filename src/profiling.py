@@ -0,0 +1,177 @@
+import json
+import os
+from functools import wraps
+from time import perf_counter
+
+FIELDS = ["calls", "seconds", "bars", "hits", "misses"]
+
+_enabled = os.environ.get("BACKTESTING_MC_PROFILE", "") not in ("", "0")
+_stats = {}
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = bool(on)
+
+
+def disable():
+    enable(False)
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, seconds: float = 0.0, bars: int = 0, calls: int = 1, hit: bool = None):
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats[name] = [0, 0.0, 0, 0, 0]
+    stats[0] += calls
+    stats[1] += seconds
+    stats[2] += int(bars)
+    if hit is not None:
+        stats[3 if hit else 4] += 1
+
+
+class Phase:
+    """
+    Times a with block into the stats of name, bars: bars processed (can be set inside the block),
+    hit: cache hit (True) or miss (False), if it's a cache lookup.
+    """
+
+    def __init__(self, name, bars: int = 0, hit: bool = None):
+        self.name = name
+        self.bars = bars
+        self.hit = hit
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, perf_counter() - self.start, self.bars, hit=self.hit)
+        return False
+
+
+class NoPhase:
+    bars = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_no_phase = NoPhase()
+
+
+def phase(name, bars: int = 0, hit: bool = None):
+    """
+    with phase(name, bars): ... timed when profiling is enabled, a shared no-op otherwise.
+    """
+    return Phase(name, bars, hit) if _enabled else _no_phase
+
+
+def instrument(name: str = None):
+    """
+    Decorator recording the calls and wall time of a function when profiling is enabled.
+    On a functools.cache function it also records the cache hits/misses, and keeps cache_info/cache_clear.
+    """
+
+    def decorator(func):
+        key = name or func.__qualname__
+        cache_info = getattr(func, "cache_info", None)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            hits = cache_info().hits if cache_info else None
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hit = None if hits is None else cache_info().hits > hits
+                record(key, perf_counter() - start, hit=hit)
+
+        for attr in ["cache_info", "cache_clear", "cache_parameters"]:
+            if hasattr(func, attr):
+                setattr(wrapper, attr, getattr(func, attr))
+        return wrapper
+
+    return decorator
+
+
+def reset():
+    _stats.clear()
+
+
+def init_worker(on: bool):
+    """
+    Pool initializer: same enabled state as the parent and no stats inherited from it (fork).
+    """
+    enable(on)
+    reset()
+
+
+def drain():
+    """
+    Stats recorded in this process since the last drain (and clears them), to send them to the parent
+    process, see merge. None if profiling is disabled.
+    """
+    if not _enabled:
+        return None
+    stats = {name: list(values) for name, values in _stats.items()}
+    _stats.clear()
+    return stats
+
+
+def merge(stats):
+    """
+    Adds the stats drained in another process (or None).
+    """
+    for name, values in (stats or {}).items():
+        current = _stats.setdefault(name, [0, 0.0, 0, 0, 0])
+        for i, value in enumerate(values):
+            current[i] += value
+
+
+def summary():
+    """
+    {name: {calls, seconds, bars, hits, misses, bars_per_s, hit_rate}}, slowest first.
+    """
+    out = {}
+    for name, values in sorted(_stats.items(), key=lambda item: -item[1][1]):
+        row = dict(zip(FIELDS, values))
+        row["bars_per_s"] = row["bars"] / row["seconds"] if row["bars"] and row["seconds"] else None
+        lookups = row["hits"] + row["misses"]
+        row["hit_rate"] = row["hits"] / lookups if lookups else None
+        out[name] = row
+    return out
+
+
+def table(stats=None):
+    stats = summary() if stats is None else stats
+    width = max([len("name")] + [len(name) for name in stats])
+    lines = [f"{'name':<{width}} {'calls':>8} {'seconds':>10} {'bars':>12} {'bars/s':>12} {'hit rate':>8}"]
+    for name, row in stats.items():
+        bars_per_s = f"{row['bars_per_s']:.4g}" if row["bars_per_s"] else "-"
+        hit_rate = f"{row['hit_rate']:.1%}" if row["hit_rate"] is not None else "-"
+        counts = f"{row['calls']:>8} {row['seconds']:>10.4f} {row['bars']:>12}"
+        lines.append(f"{name:<{width}} {counts} {bars_per_s:>12} {hit_rate:>8}")
+    return "\n".join(lines)
+
+
+def dump(path):
+    """
+    Writes the summary to path (JSON) and the table to path + ".txt".
+    """
+    stats = summary()
+    with open(path, "w") as file:
+        json.dump(stats, file, indent=1)
+    with open(f"{path}.txt", "w") as file:
+        file.write(table(stats) + "\n")
+
+
+# EOF
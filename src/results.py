@@ -0,0 +1,202 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, results are stored as .npy columns without it
+    pa = pq = None
+
+CATEGORIES = ["period", "comp_code", "strategy", "params"]
+
+# One row per (period, ticker, strategy, params), the values shared by all its simulations.
+TASK_COLUMNS = {
+    "period": np.int32,
+    "comp_code": np.int32,
+    "strategy": np.int32,
+    "params": np.int32,
+    "M_future": np.float64,
+    "L_future": np.int32,
+    "W_future": np.int32,
+}
+
+# One row per simulation, task: row of the task table.
+SIM_COLUMNS = {
+    "task": np.int32,
+    "sim_n": np.int32,
+    "M_past": np.float64,
+    "L_past": np.int32,
+    "W_past": np.int32,
+}
+
+MANIFEST = "manifest.json"
+
+
+def write_table(path, columns, file_format):
+    """
+    {name: array} to path.parquet, or to path/ as one .npy per column.
+    """
+    if file_format == "parquet":
+        pq.write_table(pa.table(columns), f"{path}.parquet")
+        return f"{os.path.basename(path)}.parquet"
+    os.makedirs(path, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(path, f"{name}.npy"), values)
+    return os.path.basename(path)
+
+
+def read_table(path, columns, task_ids=None):
+    """
+    Columns of a table written by write_table, only the rows whose task is in task_ids (if given):
+    Parquet filters them while reading, .npy columns are memory mapped and only the matching rows copied.
+    """
+    if path.endswith(".parquet"):
+        filters = None if task_ids is None else [("task", "in", [int(task) for task in task_ids])]
+        table = pq.read_table(path, columns=list(columns), filters=filters)
+        return {name: table.column(name).to_numpy() for name in columns}
+    rows = slice(None)
+    if task_ids is not None:
+        rows = np.isin(np.load(os.path.join(path, "task.npy"), mmap_mode="r"), task_ids)
+    return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")[rows] for name in columns}
+
+
+class ResultStore:
+    """
+    Results of a backtesting MC run in typed columns: ticker, strategy, period and params (one param set
+    per distinct json) are integer codes, the future results are stored once per task and the simulations
+    (M_past, L_past, W_past) fill preallocated chunks of chunk_size rows, flushed to root as they fill up
+    (Parquet with pyarrow, .npy columns otherwise). Use it as a context manager, or close it.
+    Read it with read_results / aggregate_results.
+    """
+
+    def __init__(self, root, chunk_size: int = 1_000_000, file_format: str = None):
+        self.root = root
+        self.file_format = file_format or ("parquet" if pq is not None else "npy")
+        if self.file_format == "parquet" and pq is None:
+            raise ImportError("file_format='parquet' needs pyarrow")
+        os.makedirs(root, exist_ok=True)
+        self.categories = {col: {} for col in CATEGORIES}
+        self.tasks = {col: [] for col in TASK_COLUMNS}
+        self.chunk = {col: np.empty(chunk_size, dtype=dtype) for col, dtype in SIM_COLUMNS.items()}
+        self.chunk_rows = 0
+        self.chunks = []
+
+    def code(self, col, value):
+        return self.categories[col].setdefault(value, len(self.categories[col]))
+
+    def add(self, period, comp_code, strategy, params, M_past, L_past, W_past, future=(np.nan, 0, 0)):
+        """
+        Adds the simulations of one task, M_past/L_past/W_past: one per simulation (sim_n 1, 2, ...),
+        future: (M_future, L_future, W_future). output: task id.
+        """
+        params = params if isinstance(params, str) else json.dumps(params)
+        task = len(self.tasks["period"])
+        for col, value in zip(CATEGORIES, [period, comp_code, strategy, params]):
+            self.tasks[col].append(self.code(col, value))
+        for col, value in zip(["M_future", "L_future", "W_future"], future):
+            self.tasks[col].append(value)
+        values = {
+            "task": np.full(len(M_past), task),
+            "sim_n": np.arange(1, len(M_past) + 1),
+            "M_past": M_past,
+            "L_past": L_past,
+            "W_past": W_past,
+        }
+        chunk_size = len(self.chunk["task"])
+        done = 0
+        while done < len(M_past):
+            n_rows = min(chunk_size - self.chunk_rows, len(M_past) - done)
+            for col, column in self.chunk.items():
+                column[self.chunk_rows : self.chunk_rows + n_rows] = values[col][done : done + n_rows]
+            self.chunk_rows += n_rows
+            done += n_rows
+            if self.chunk_rows == chunk_size:
+                self.flush()
+        return task
+
+    def flush(self):
+        if not self.chunk_rows:
+            return
+        tasks = self.chunk["task"][: self.chunk_rows]
+        path = os.path.join(self.root, f"sims-{len(self.chunks):05d}")
+        columns = {col: values[: self.chunk_rows] for col, values in self.chunk.items()}
+        file_name = write_table(path, columns, self.file_format)
+        self.chunks.append(
+            {"file": file_name, "rows": self.chunk_rows, "task_min": int(tasks.min()), "task_max": int(tasks.max())}
+        )
+        self.chunk_rows = 0
+
+    def close(self):
+        self.flush()
+        tasks = {col: np.asarray(values, dtype=TASK_COLUMNS[col]) for col, values in self.tasks.items()}
+        manifest = {
+            "tasks": write_table(os.path.join(self.root, "tasks"), tasks, self.file_format),
+            "chunks": self.chunks,
+            "categories": {col: list(values) for col, values in self.categories.items()},
+        }
+        with open(os.path.join(self.root, MANIFEST), "w") as file:
+            json.dump(manifest, file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_tasks(root, filters=None):
+    """
+    Task table of a ResultStore (categorical period, comp_code, strategy, params), filters: {column: value
+    or list of values} on its columns. output: manifest, DataFrame indexed by task id.
+    """
+    with open(os.path.join(root, MANIFEST)) as file:
+        manifest = json.load(file)
+    tasks = pd.DataFrame(read_table(os.path.join(root, manifest["tasks"]), TASK_COLUMNS))
+    for col in CATEGORIES:
+        tasks[col] = pd.Categorical.from_codes(tasks[col], categories=manifest["categories"][col])
+    for col, value in (filters or {}).items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        tasks = tasks[tasks[col].isin(values)]
+    return manifest, tasks
+
+
+def read_results(root, filters=None):
+    """
+    Simulation rows of a ResultStore (the RESULTS_MC_COLUMNS of the grid runner), only the tasks
+    matching filters ({column: value or list}, see read_tasks): the chunks without those tasks are not read.
+    """
+    manifest, tasks = read_tasks(root, filters)
+    task_ids = tasks.index.to_numpy()
+    columns = {col: [] for col in SIM_COLUMNS}
+    for chunk in manifest["chunks"]:
+        in_chunk = task_ids[(task_ids >= chunk["task_min"]) & (task_ids <= chunk["task_max"])]
+        if not len(in_chunk):
+            continue
+        all_tasks = len(in_chunk) == chunk["task_max"] - chunk["task_min"] + 1
+        table = read_table(os.path.join(root, chunk["file"]), SIM_COLUMNS, None if all_tasks else in_chunk)
+        for col in SIM_COLUMNS:
+            columns[col].append(np.asarray(table[col]))
+    sims = {}
+    for col, dtype in SIM_COLUMNS.items():
+        sims[col] = np.concatenate(columns[col]) if columns[col] else np.empty(0, dtype=dtype)
+    df = tasks.reindex(sims["task"]).reset_index(drop=True)
+    for col in ["sim_n", "M_past", "L_past", "W_past"]:
+        df[col] = sims[col]
+    return df[CATEGORIES + ["sim_n", "M_past", "L_past", "W_past", "M_future", "L_future", "W_future"]]
+
+
+def aggregate_results(root, filters=None):
+    """
+    Per task sums of M_past/L_past/W_past over the simulations (the df.groupby(hash_cols).sum() of the
+    ranking step) and the number of simulations, with the task's future results.
+    """
+    df = read_results(root, filters)
+    sums = df.groupby(CATEGORIES, observed=True, sort=False)[["M_past", "L_past", "W_past"]].sum()
+    sums["n_sims"] = df.groupby(CATEGORIES, observed=True, sort=False).size()
+    future = df.groupby(CATEGORIES, observed=True, sort=False)[["M_future", "L_future", "W_future"]].first()
+    return sums.join(future).reset_index()
+
+
+# EOF
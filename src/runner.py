@@ -0,0 +1,214 @@
+import json
+import zlib
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from src.helpers import get_data_history, iter_data_history_BackMC
+from src.sharedmem import SharedArrays, attach
+from src import profiling
+from src.results import ResultStore
+import src.advanced_strategies as advanced_strategies
+import src.momentum as momentum
+import src.overlap as overlap
+
+STRATEGIES = {
+    class_obj.__name__: class_obj
+    for class_obj in [
+        advanced_strategies.ADXRSI,
+        advanced_strategies.WilliansppRMACD,
+        overlap.SMA,
+        overlap.SuperTrend,
+        momentum.AwesomeOscillator,
+        momentum.CommodityChannelIndex,
+        momentum.CoppockCurve,
+        momentum.WilliansppR,
+        momentum.MACD,
+    ]
+}
+
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+RESULTS_MC_COLUMNS = [
+    "period",
+    "comp_code",
+    "strategy",
+    "params",
+    "sim_n",
+    "M_past",
+    "L_past",
+    "W_past",
+    "M_future",
+    "L_future",
+    "W_future",
+]
+
+
+def expand_params(strategies_params):
+    """
+    {strategy name: [params]} -> [(strategy name, params)], one entry per LOOKBACK_STRATEGY_PARAM value.
+    """
+    run_params = []
+    for strategy, class_params in strategies_params.items():
+        for params in class_params:
+            if "LOOKBACK_STRATEGY_PARAM" not in params:
+                run_params.append((strategy, params))
+            else:
+                for lb in params["LOOKBACK_STRATEGY_PARAM"]:
+                    tmp = dict(params)
+                    tmp["LOOKBACK_STRATEGY_PARAM"] = lb
+                    run_params.append((strategy, tmp))
+    return run_params
+
+
+def mix_seed(comp_code, period, seed):
+    """
+    Seed of the simulations of one ticker/period: the run seed mixed with the ticker/period.
+    The run seed must be an int, so every worker mixes the same one (no fresh entropy as seed=None in
+    get_data_history_BackMC).
+    """
+    if isinstance(seed, bool) or not isinstance(seed, (int, np.integer)):
+        raise ValueError(f"seed must be an int, got {seed!r}")
+    return int(seed), zlib.crc32(f"{comp_code}/{period}".encode())
+
+
+def get_paths_BackMC(comp_code, intraday_data, period, N_MC_Sims, seed, noise=None):
+    """
+    All the simulations of one ticker/period, the seed is mixed with the ticker/period.
+    """
+    seed = mix_seed(comp_code, period, seed)
+    return next(iter_data_history_BackMC(comp_code, intraday_data, period, N_MC_Sims, N_MC_Sims, seed, noise=noise))
+
+
+def share_data(shared, comp_code, intraday_data, period, N_MC_Sims, seed, noise=None):
+    """
+    Puts the daily OHLCV of the future period and the simulated paths of one ticker/period in shared memory.
+    output: {"future": {col: spec}, "paths": {col: spec}}, or None if there is no data.
+    """
+    _, df_future = get_data_history(comp_code, intraday_data, period)
+    if df_future.empty:
+        return None
+    paths = get_paths_BackMC(comp_code, intraday_data, period, N_MC_Sims, seed, noise)
+    return {
+        "future": {col: shared.put(df_future[col].to_numpy()) for col in OHLCV_COLUMNS},
+        "paths": {col: shared.put(values) for col, values in paths.ohlcv.items()},
+    }
+
+
+def run_task(task):
+    """
+    Backtesting MC of one (period, ticker, strategy, params).
+    The data comes as shared memory specs (see share_data), attached without copies.
+    output: the task result (see backtest_task), and the profiling stats of the task (None if disabled).
+    """
+    with profiling.phase("run_task"):
+        result = backtest_task(*task)
+    return result, profiling.drain()
+
+
+def backtest_task(period, comp_code, strategy, params, data):
+    """
+    output: period, comp_code, strategy, json params, M_past, L_past, W_past (one per simulation)
+    and future (M_future, L_future, W_future).
+    """
+    df_future = pd.DataFrame({col: attach(spec) for col, spec in data["future"].items()})
+    paths = {col: attach(spec) for col, spec in data["paths"].items()}
+    algo = STRATEGIES[strategy](params)
+    algo.apply_strategy(df_future, 1.0)
+    M_final_future, M_diffs_future = algo.metrics()
+    M_diffs_future = np.array(M_diffs_future)
+    future = [M_final_future, sum(M_diffs_future > 0), sum(M_diffs_future < 0)]
+    M_final, wins, losses = algo.apply_strategy_batch(paths, 1.0)
+    return period, comp_code, strategy, json.dumps(params), M_final, wins, losses, future
+
+
+def get_rows(result):
+    """
+    backtest_task result -> results rows (RESULTS_MC_COLUMNS), one per simulation.
+    """
+    period, comp_code, strategy, params, M_final, wins, losses, future = result
+    return [
+        [period, comp_code, strategy, params, sim_n + 1, M_final[sim_n], wins[sim_n], losses[sim_n], *future]
+        for sim_n in range(len(M_final))
+    ]
+
+
+def iter_grid_results(
+    strategies_params,
+    comp_codes,
+    intraday_data,
+    periods=("1st", "2nd", "year"),
+    N_MC_Sims: int = 100,
+    seed: int = 0,
+    processes: int = None,
+    noise=None,
+    profile_path: str = None,
+):
+    """
+    Shards the period x ticker x strategy x params grid across a process pool and yields the
+    task results (see backtest_task) as they are done, in no particular order.
+    The data of each ticker/period is loaded and simulated once, here, and shared with the workers
+    through shared memory, tasks only carry names, params and segment specs. The segments are
+    unlinked when the generator is exhausted or closed. processes=1 runs in this process.
+    noise: NoiseModel of the simulations (src.noise), default GaussianNoise.
+    profile_path: enables the profiling (src.profiling) of the run, workers included, and writes its
+    summary there (JSON, and the table in profile_path + ".txt") at the end: the stats of this run only,
+    the profiling is reset before it and back to its previous state (enabled or not) after it.
+    """
+    was_enabled = profiling.is_enabled()
+    if profile_path:
+        profiling.reset()
+        profiling.enable()
+    run_params = expand_params(strategies_params)
+    try:
+        with SharedArrays() as shared:
+            tasks = []
+            for period in periods:
+                for comp_code in comp_codes:
+                    data = share_data(shared, comp_code, intraday_data, period, N_MC_Sims, seed, noise)
+                    if data is not None:
+                        tasks.extend((period, comp_code, strategy, params, data) for strategy, params in run_params)
+            if processes == 1:
+                for result, stats in map(run_task, tasks):
+                    profiling.merge(stats)
+                    yield result
+                return
+            with Pool(processes, profiling.init_worker, (profiling.is_enabled(),)) as pool:
+                for result, stats in pool.imap_unordered(run_task, tasks):
+                    profiling.merge(stats)
+                    yield result
+    finally:
+        if profile_path:
+            try:
+                profiling.dump(profile_path)
+            finally:
+                profiling.enable(was_enabled)
+
+
+def iter_grid(strategies_params, comp_codes, intraday_data, **kwargs):
+    """
+    iter_grid_results as results rows (RESULTS_MC_COLUMNS), one per simulation.
+    """
+    for result in iter_grid_results(strategies_params, comp_codes, intraday_data, **kwargs):
+        yield from get_rows(result)
+
+
+def run_grid(strategies_params, comp_codes, intraday_data, **kwargs):
+    """
+    iter_grid as a DataFrame, same columns as results_backtestingMC.csv.
+    """
+    rows = list(iter_grid(strategies_params, comp_codes, intraday_data, **kwargs))
+    return pd.DataFrame(rows, columns=RESULTS_MC_COLUMNS)
+
+
+def store_grid(strategies_params, comp_codes, intraday_data, root, chunk_size: int = 1_000_000, **kwargs):
+    """
+    iter_grid_results into a ResultStore at root (see src.results), typed columns flushed in chunks
+    instead of rows in memory. output: root.
+    """
+    with ResultStore(root, chunk_size) as store:
+        for result in iter_grid_results(strategies_params, comp_codes, intraday_data, **kwargs):
+            store.add(*result)
+    return root
+
+
+# EOF
@@ -0,0 +1,72 @@
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+_owned = {}
+_attached = {}
+
+
+class SharedArrays:
+    """
+    Owner of the shared memory segments of a run (use it as a context manager).
+    put copies an array to a new segment and returns its spec, small enough to send to the
+    workers, where attach gives a zero-copy view. All the segments are unlinked on exit.
+    Arrays broadcast along the first axis (e.g. MCPaths open/high/low/volume) are stored once.
+    """
+
+    def __init__(self):
+        self.segments = []
+
+    def put(self, array):
+        array = np.asarray(array)
+        shape = array.shape
+        if array.ndim > 1 and array.strides[0] == 0:
+            array = array[:1]
+        array = np.ascontiguousarray(array)
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.segments.append(shm)
+        _owned[shm.name] = shm
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        return shm.name, array.shape, array.dtype.str, shape
+
+    def close(self):
+        while self.segments:
+            shm = self.segments.pop()
+            _owned.pop(shm.name, None)
+            _attached.pop(shm.name, None)
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach(spec):
+    """
+    Read-only view of an array shared by SharedArrays.put, the segment is opened once per process.
+    """
+    name, shape, dtype, broadcast_shape = spec
+    if name not in _attached:
+        if name in _owned:
+            shm = _owned[name]
+        else:
+            shm = open_segment(name)
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        array.flags.writeable = False
+        _attached[name] = shm, np.broadcast_to(array, broadcast_shape)
+    return _attached[name][1]
+
+
+def open_segment(name):
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13: the owner, not this process, must unlink it.
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# EOF
@@ -0,0 +1,557 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+import numpy as np
+from src.helpers import get_data_store
+from src.runner import STRATEGIES
+
+nan = math.nan
+OHLCV = ["open", "high", "low", "close", "volume"]
+
+
+def divide(a, b):
+    """
+    a / b with the numpy results where b is 0 (+-inf, NaN for 0 / 0) instead of ZeroDivisionError.
+    """
+    if b == 0:
+        if a == 0 or a != a:
+            return nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+def fmax(a, b):
+    """
+    np.fmax of two floats: the other one if one is NaN.
+    """
+    if a != a:
+        return b
+    if b != b:
+        return a
+    return max(a, b)
+
+
+##########################################################################################
+#
+# Indicators, one value at a time
+#
+##########################################################################################
+
+
+class RollingMean:
+    """
+    Series.rolling(period).mean(), one value at a time: pandas' running sum (Kahan compensated,
+    exact on constant windows), same values.
+    """
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque()
+        self.sum = 0.0
+        self.add_compensation = 0.0
+        self.remove_compensation = 0.0
+        self.nobs = 0
+        self.negatives = 0
+        self.same = 0
+        self.last = nan
+
+    def update(self, value):
+        self.window.append(value)
+        if len(self.window) > self.period:
+            old = self.window.popleft()
+            if old == old:
+                self.nobs -= 1
+                y = -old - self.remove_compensation
+                t = self.sum + y
+                self.remove_compensation = t - self.sum - y
+                self.sum = t
+                self.negatives -= math.copysign(1.0, old) < 0
+        if value == value:
+            self.nobs += 1
+            y = value - self.add_compensation
+            t = self.sum + y
+            self.add_compensation = t - self.sum - y
+            self.sum = t
+            self.negatives += math.copysign(1.0, value) < 0
+            self.same = self.same + 1 if value == self.last else 1
+            self.last = value
+        if len(self.window) < self.period or self.nobs < self.period:
+            return nan
+        if self.same >= self.nobs:
+            return self.last
+        mean = self.sum / self.nobs
+        if (self.negatives == 0 and mean < 0) or (self.negatives == self.nobs and mean > 0):
+            return 0.0
+        return mean
+
+
+class RollingExtremum:
+    """
+    Series.rolling(period).max() (maximum=True) or .min(), one value at a time: monotonic deque of
+    the window's candidates, amortized O(1).
+    """
+
+    def __init__(self, period: int, maximum: bool = True):
+        self.period = period
+        self.sign = 1.0 if maximum else -1.0
+        self.candidates = deque()
+        self.nans = deque()
+        self.bar = -1
+
+    def update(self, value):
+        self.bar += 1
+        start = self.bar - self.period + 1
+        while self.candidates and self.candidates[0][0] < start:
+            self.candidates.popleft()
+        while self.nans and self.nans[0] < start:
+            self.nans.popleft()
+        if value != value:
+            self.nans.append(self.bar)
+        else:
+            while self.candidates and self.sign * self.candidates[-1][1] <= self.sign * value:
+                self.candidates.pop()
+            self.candidates.append((self.bar, value))
+        if start < 0 or self.nans:
+            return nan
+        return self.candidates[0][1]
+
+
+class RollingWindow:
+    """
+    The last period values, func(window array) once there are period of them (NaN before), as
+    AlgoTradeBase.rolling_windows. O(period) per value.
+    """
+
+    def __init__(self, period: int, func):
+        self.window = deque(maxlen=period)
+        self.func = func
+
+    def update(self, value):
+        self.window.append(value)
+        if len(self.window) < self.window.maxlen:
+            return nan
+        return float(self.func(np.array(self.window)))
+
+
+class EWMean:
+    """
+    Series.ewm(com=com, adjust=adjust).mean(), one value at a time: pandas' recursion, same values.
+    span: com = (span - 1) / 2.
+    """
+
+    def __init__(self, com: float, adjust: bool = True):
+        alpha = 1.0 / (1.0 + com)
+        self.old_wt_factor = 1.0 - alpha
+        self.new_wt = 1.0 if adjust else alpha
+        self.adjust = adjust
+        self.weighted = nan
+        self.old_wt = 1.0
+
+    def update(self, value):
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if value == value:
+                if self.weighted != value:
+                    self.weighted = self.old_wt * self.weighted + self.new_wt * value
+                    self.weighted /= self.old_wt + self.new_wt
+                self.old_wt = self.old_wt + self.new_wt if self.adjust else 1.0
+        elif value == value:
+            self.weighted = value
+        return self.weighted
+
+
+##########################################################################################
+#
+# Strategies, one bar at a time
+#
+##########################################################################################
+
+
+class StreamingStrategy(ABC):
+    """
+    Online counterpart of an AlgoTradeBase strategy, for live bars: update(bar) (a mapping with high,
+    low, close) updates the indicators, the signal state, the position and the budget in constant time
+    per bar (O(lookback) for the window statistics), and returns the bar's signal (1: buy, -1: sell,
+    0: keep). The signals, positions and trades are those of apply_strategy on the bars seen so far.
+    """
+
+    initial_state = 0
+    delay = False  # the signal of a bar is at the next bar (ADX and RSI alone, as their batch signals)
+
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        self.strategy_parameters = strategy_parameters
+        self.state = self.initial_state
+        self.pending = 0
+        self.n_bars = 0
+        self.position = None
+        self.entry_price = nan
+        self.close = nan
+        self.M = M_initial
+        self.M_diffs = []
+
+    @abstractmethod
+    def step(self, bar):
+        """
+        Updates the indicators with bar. output: (enter, exit) conditions of the bar, None for a bar
+        without signal (not in the strategy's close history, e.g. the first one of SuperTrend).
+        """
+        raise NotImplementedError
+
+    def emit(self, enter, exit):
+        """
+        AlgoTradeBase.state_signal, one bar: 1 / -1 when enter / exit changes the state, 0 otherwise.
+        """
+        event = 1 if enter else -1 if exit else 0
+        if event == 0 or event == self.state:
+            return 0
+        self.state = event
+        return event
+
+    def update(self, bar):
+        events = self.step(bar)
+        if events is None:
+            return None
+        signal = self.emit(*events)
+        if self.delay:
+            signal, self.pending = self.pending, signal
+        self.trade(signal, float(bar["close"]))
+        return signal
+
+    def trade(self, signal, close):
+        """
+        AlgoTradeBase.get_positions and get_trades, one bar: position 1 before the first signal,
+        buy at a 0 -> 1 change (or at the first bar), sell at a 1 -> 0 change.
+        """
+        position = 1 if signal == 1 else 0 if signal == -1 else 1 if self.position is None else self.position
+        if position and not self.position:
+            self.entry_price = close
+        elif not position and self.position:
+            self.M, M_diff = self.sell(close)
+            self.M_diffs.append(M_diff)
+        self.position = position
+        self.close = close
+        self.n_bars += 1
+
+    def sell(self, close):
+        M = close * (self.M / self.entry_price)
+        return M, M - self.M
+
+    def result(self):
+        """
+        M and M_diffs of apply_strategy on the bars so far (selling at the last close if bought).
+        """
+        if not self.position:
+            return self.M, list(self.M_diffs)
+        M, M_diff = self.sell(self.close)
+        return M, self.M_diffs + [M_diff]
+
+
+class SMAStream(StreamingStrategy):
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        self.short = RollingMean(strategy_parameters["SHORT_WINDOW"])
+        self.long = RollingMean(strategy_parameters["LONG_WINDOW"])
+
+    def step(self, bar):
+        close = float(bar["close"])
+        sma1, sma2 = self.short.update(close), self.long.update(close)
+        return sma1 > sma2, sma2 > sma1
+
+
+class SuperTrendStream(StreamingStrategy):
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        self.multiplier = strategy_parameters.get("MULTIPLIER", 3)
+        self.atr = EWMean(strategy_parameters.get("LOOKBACK_STRATEGY_PARAM", 10))
+        self.prev_close = nan
+        self.started = False
+        self.final_upper = self.final_lower = self.st = 0.0
+        self.prev = None  # (st, close) of the previous bar with signal
+
+    def step(self, bar):
+        high, low, close = (float(bar[col]) for col in ["high", "low", "close"])
+        tr = fmax(fmax(high - low, abs(high - self.prev_close)), abs(low - self.prev_close))
+        atr = self.atr.update(tr)
+        hl_avg = (high + low) / 2
+        upper_band, lower_band = hl_avg + self.multiplier * atr, hl_avg - self.multiplier * atr
+        prev_close, self.prev_close = self.prev_close, close
+        if not self.started:  # supertrend starts at 0, the strategy at the second bar
+            self.started = True
+            return None
+        upper_prev, lower_prev, st_prev = self.final_upper, self.final_lower, self.st
+        upper = upper_band if upper_band < upper_prev or prev_close > upper_prev else upper_prev
+        lower = lower_band if lower_band > lower_prev or prev_close < lower_prev else lower_prev
+        st = 0.0
+        if st_prev == upper_prev and close < upper:
+            st = upper
+        elif st_prev == upper_prev and close > upper:
+            st = lower
+        elif st_prev == lower_prev and close > lower:
+            st = lower
+        elif st_prev == lower_prev and close < lower:
+            st = upper
+        self.final_upper, self.final_lower, self.st = upper, lower, st
+        prev, self.prev = self.prev, (st, close)
+        if prev is None:
+            return False, False
+        return (prev[0] > prev[1]) and (st < close), (prev[0] < prev[1]) and (st > close)
+
+
+class WilliansppRStream(StreamingStrategy):
+    enter_level, exit_level = -80, -20
+
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        lookback = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
+        self.highh = RollingExtremum(lookback, maximum=True)
+        self.lowl = RollingExtremum(lookback, maximum=False)
+        self.wr_prev = nan
+
+    def update_wr(self, bar):
+        high, low, close = (float(bar[col]) for col in ["high", "low", "close"])
+        highh, lowl = self.highh.update(high), self.lowl.update(low)
+        return -100 * divide(highh - close, highh - lowl)
+
+    def step(self, bar):
+        wr = self.update_wr(bar)
+        wr_prev, self.wr_prev = self.wr_prev, wr
+        return (wr_prev > self.enter_level) and (wr < self.enter_level), (wr_prev < self.exit_level) and (
+            wr > self.exit_level
+        )
+
+
+class MACDStream(StreamingStrategy):
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        slow = strategy_parameters.get("SLOW", 26)
+        fast = strategy_parameters.get("FAST", 12)
+        smooth = strategy_parameters.get("SMOOTH", 9)
+        self.fast = EWMean((fast - 1) / 2, adjust=False)
+        self.slow = EWMean((slow - 1) / 2, adjust=False)
+        self.smooth = EWMean((smooth - 1) / 2, adjust=False)
+
+    def update_macd(self, close):
+        """
+        macd and macd signal of get_macd, NaN as 0 (the strategies' fillna(0)).
+        """
+        macd = self.fast.update(close) - self.slow.update(close)
+        macd_signal = self.smooth.update(macd)
+        return (0.0 if value != value else value for value in (macd, macd_signal))
+
+    def step(self, bar):
+        macd, macd_signal = self.update_macd(float(bar["close"]))
+        return macd > macd_signal, macd < macd_signal
+
+
+class WilliansppRMACDStream(MACDStream):
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        self.wr = WilliansppRStream(strategy_parameters, M_initial)
+        self.wr_prev = nan
+
+    def step(self, bar):
+        wr = self.wr.update_wr(bar)
+        wr = 0.0 if wr != wr else wr
+        macd, macd_signal = self.update_macd(float(bar["close"]))
+        wr_prev, self.wr_prev = self.wr_prev, wr
+        return (wr_prev > -50) and (wr < -50) and (macd > macd_signal), (wr_prev < -50) and (wr > -50) and (
+            macd < macd_signal
+        )
+
+
+class AwesomeOscillatorStream(StreamingStrategy):
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        self.short = RollingMean(strategy_parameters["short_period"])
+        self.long = RollingMean(strategy_parameters["long_period"])
+        self.prev_close = nan
+        self.ao_prev = nan
+
+    def step(self, bar):
+        close = float(bar["close"])
+        median = (self.prev_close + close) / 2  # rolling(2).median()
+        self.prev_close = close
+        ao = self.short.update(median) - self.long.update(median)
+        ao_prev, self.ao_prev = self.ao_prev, ao
+        return (ao > 0) and (ao_prev < 0), (ao < 0) and (ao_prev > 0)
+
+
+class CommodityChannelIndexStream(StreamingStrategy):
+    lower_band, upper_band = -150, 150
+
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        lookback = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
+        self.sma_pt = RollingMean(lookback)
+        self.mad = RollingWindow(lookback, lambda window: np.abs(window - window.mean()).mean())
+        self.cci_prev = nan
+
+    def step(self, bar):
+        high, low, close = (float(bar[col]) for col in ["high", "low", "close"])
+        pt = (high + low + close) / 3
+        cci = divide(pt - self.sma_pt.update(pt), 0.015 * self.mad.update(close))  # MAD of close, as get_cci
+        cci_prev, self.cci_prev = self.cci_prev, cci
+        return (cci_prev > self.lower_band) and (cci < self.lower_band), (cci_prev < self.upper_band) and (
+            cci > self.upper_band
+        )
+
+
+class CoppockCurveStream(StreamingStrategy):
+    initial_state = 1
+
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        self.short = strategy_parameters["shortROC"]
+        self.long = strategy_parameters["longROC"]
+        self.closes = deque([nan] * max(self.short, self.long), maxlen=max(self.short, self.long) + 1)
+        weights = np.arange(1, 11)  # the batch strategy uses a WMA of 10, whatever lookbackWMA
+        self.wma = RollingWindow(10, lambda window: window @ weights / weights.sum())
+        self.cc_prev = deque([nan] * 4, maxlen=4)
+
+    def roc(self, n):
+        difference = self.closes[-1] - self.closes[-1 - n]
+        return divide(difference, self.closes[-1 - n]) * 100
+
+    def step(self, bar):
+        self.closes.append(float(bar["close"]))
+        cc = self.wma.update(self.roc(self.long) + self.roc(self.short))
+        cc_prev = list(self.cc_prev)
+        self.cc_prev.appendleft(cc)
+        return (cc > 0) and all(prev < 0 for prev in cc_prev), (cc < 0) and all(prev > 0 for prev in cc_prev)
+
+    def emit(self, enter, exit):
+        signal = super().emit(enter, exit)
+        return 1 if self.n_bars == 0 else signal
+
+
+class ADXRSIStream(StreamingStrategy):
+    def __init__(self, strategy_parameters, M_initial: float = 1.0):
+        super().__init__(strategy_parameters, M_initial)
+        lookback = strategy_parameters["LOOKBACK_STRATEGY_PARAM"]
+        self.RSI = strategy_parameters.get("RSI", True)
+        self.ADX = strategy_parameters.get("ADX", True)
+        if not (self.RSI or self.ADX):
+            raise ValueError("ADXRSI needs RSI and/or ADX")
+        self.delay = not (self.RSI and self.ADX)
+        self.lookback = lookback
+        alpha = 1 / lookback
+        com = (1 - alpha) / alpha
+        self.atr = RollingMean(lookback)
+        self.plus_dm = EWMean(com)
+        self.minus_dm = EWMean(com)
+        self.adx_smooth = EWMean(com)
+        self.up = EWMean(lookback - 1, adjust=False)
+        self.down = EWMean(lookback - 1, adjust=False)
+        self.prev = (nan, nan, nan)
+        self.dx_prev = self.adx_prev = self.rsi_prev = nan
+        self.valid_rsi = 0
+
+    def update_adx(self, high, low, close, prev_high, prev_low, prev_close):
+        """
+        plus_di, minus_di, adx of get_adx_arrays.
+        """
+        plus_dm, minus_dm = high - prev_high, low - prev_low
+        plus_dm = 0.0 if plus_dm < 0 else plus_dm
+        minus_dm = 0.0 if minus_dm > 0 else minus_dm
+        tr = fmax(fmax(high - low, abs(high - prev_close)), abs(low - prev_close))
+        atr = self.atr.update(tr)
+        plus_di = 100 * divide(self.plus_dm.update(plus_dm), atr)
+        minus_di = abs(100 * divide(self.minus_dm.update(minus_dm), atr))
+        dx = divide(abs(plus_di - minus_di), abs(plus_di + minus_di)) * 100
+        adx = ((self.dx_prev * (self.lookback - 1)) + dx) / self.lookback
+        self.dx_prev = dx
+        return plus_di, minus_di, self.adx_smooth.update(adx)
+
+    def update_rsi(self, close, prev_close):
+        """
+        rsi of get_rsi_arrays (NaN until its 4th value).
+        """
+        ret = close - prev_close
+        up = 0.0 if ret < 0 else ret
+        down = abs(ret if ret < 0 else 0.0)
+        rs = divide(self.up.update(up), self.down.update(down))
+        rsi = 100 - (100 / (1 + rs))
+        if rsi != rsi:
+            return nan
+        self.valid_rsi += 1
+        return rsi if self.valid_rsi > 3 else nan
+
+    def step(self, bar):
+        high, low, close = (float(bar[col]) for col in ["high", "low", "close"])
+        prev_high, prev_low, prev_close = self.prev
+        self.prev = (high, low, close)
+        if self.ADX:
+            plus_di, minus_di, adx = self.update_adx(high, low, close, prev_high, prev_low, prev_close)
+        if self.RSI:
+            rsi = self.update_rsi(close, prev_close)
+        if self.RSI and self.ADX:
+            return (adx > 35) and (plus_di < minus_di) and (rsi < 50), (adx > 35) and (plus_di > minus_di) and (
+                rsi > 50
+            )
+        if self.ADX:
+            adx_prev, self.adx_prev = self.adx_prev, adx
+            crossed = (adx_prev < 25) and (adx > 25)
+            return crossed and (plus_di > minus_di), crossed and (minus_di > plus_di)
+        rsi_prev, self.rsi_prev = self.rsi_prev, rsi
+        return (rsi_prev > 30) and (rsi < 30), (rsi_prev < 70) and (rsi > 70)
+
+
+STREAMS = {
+    "ADXRSI": ADXRSIStream,
+    "WilliansppRMACD": WilliansppRMACDStream,
+    "SMA": SMAStream,
+    "SuperTrend": SuperTrendStream,
+    "AwesomeOscillator": AwesomeOscillatorStream,
+    "CommodityChannelIndex": CommodityChannelIndexStream,
+    "CoppockCurve": CoppockCurveStream,
+    "WilliansppR": WilliansppRStream,
+    "MACD": MACDStream,
+}
+
+
+def iter_bars(df_data):
+    """
+    Rows of an OHLCV DataFrame as {column: value} bars.
+    """
+    columns = [col for col in OHLCV if col in df_data]
+    for values in zip(*(df_data[col].to_numpy() for col in columns)):
+        yield dict(zip(columns, values))
+
+
+def replay(streams, comp_code, intraday_data):
+    """
+    Replays the intraday bars of a company (the load_data CSVs, in time order) through the streams.
+    output: generator of (datetime, [signal of each stream]).
+    """
+    store = get_data_store(comp_code, intraday_data)
+    if store is None:
+        return
+    intraday = store.intraday.iloc[store.order]
+    for timestamp, bar in zip(intraday["datetime"], iter_bars(intraday)):
+        yield timestamp, [stream.update(bar) for stream in streams]
+
+
+def check_parity(strategy, strategy_parameters, df_data, M_initial: float = 1.0):
+    """
+    Streams the bars of df_data through STREAMS[strategy] and compares with the batch strategy:
+    output: {bars, signal_mismatches (bars whose signal differs from strategy()), M, M_batch,
+    match (same signals, M and M_diffs as apply_strategy)}.
+    """
+    algo = STRATEGIES[strategy](strategy_parameters)
+    signal, close = algo.strategy(df_data.copy(), strategy_parameters)
+    batch_signal = np.asarray(signal)[: len(close)]
+    algo.apply_strategy(df_data, M_initial)
+    stream = STREAMS[strategy](strategy_parameters, M_initial)
+    streamed = np.array([s for s in map(stream.update, iter_bars(df_data)) if s is not None])
+    mismatches = int((streamed != batch_signal).sum()) if len(streamed) == len(batch_signal) else len(close)
+    M, M_diffs = stream.result()
+    return {
+        "bars": len(close),
+        "signal_mismatches": mismatches,
+        "M": M,
+        "M_batch": algo.M,
+        "match": mismatches == 0 and M == algo.M and M_diffs == algo.M_diffs,
+    }
+
+
+# EOF
@@ -0,0 +1,143 @@
+import json
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from src.algotradebase import AlgoTradeBase
+from src.helpers import get_data_store
+from src.runner import STRATEGIES, expand_params
+
+WALK_FORWARD_COLUMNS = [
+    "comp_code",
+    "window",
+    "train_start",
+    "test_start",
+    "test_end",
+    "strategy",
+    "params",
+    "M_train",
+    "M_test",
+    "wins_test",
+    "losses_test",
+]
+
+
+def get_signals(run_params, df_data):
+    """
+    Strategy signals of every (strategy name, params) on the whole history, computed once: the params
+    differing only by LOOKBACK_STRATEGY_PARAM share one strategy_sweep pass.
+    output: signals (len(run_params) x len(df_data), aligned with df_data rows, 0 where a strategy
+    has no bar, e.g. the first one of SuperTrend) and first: first bar with a signal of every strategy.
+    """
+    n_bars = len(df_data)
+    signals = np.zeros((len(run_params), n_bars))
+    first = 0
+    groups = {}
+    for i, (strategy, params) in enumerate(run_params):
+        lookback = params.get("LOOKBACK_STRATEGY_PARAM")
+        others = {key: value for key, value in params.items() if key != "LOOKBACK_STRATEGY_PARAM"}
+        group = (strategy, json.dumps(others, sort_keys=True), lookback is None)
+        groups.setdefault(group, []).append((i, params, lookback))
+    for (strategy, _, single), members in groups.items():
+        rows = [i for i, _, _ in members]
+        algo = STRATEGIES[strategy](members[0][1])
+        if single:
+            signal, close = algo.strategy(df_data.copy(), algo.strategy_parameters)
+            signal = np.broadcast_to(np.asarray(signal, dtype=float)[: len(close)], (len(rows), len(close)))
+        else:
+            signal, close = algo.strategy_sweep(df_data.copy(), [lookback for _, _, lookback in members])
+            signal = np.asarray(signal, dtype=float)[:, : len(close)]
+        offset = n_bars - len(close)
+        signals[rows, offset:] = signal
+        first = max(first, offset)
+    return signals, first
+
+
+def trade_windows(position, close, starts, length: int):
+    """
+    Every row of position (the strategies' positions on the whole history, see walk_forward) traded
+    over close[start:start + length] for every start, all in one batch.
+    output: M, wins, losses (len(position) x len(starts)).
+    """
+    index = np.asarray(starts)[:, None] + np.arange(length)
+    window_position = position[:, index].reshape(-1, length)
+    window_close = np.broadcast_to(close[index], (len(position), *index.shape)).reshape(-1, length)
+    M, M_diffs, _ = AlgoTradeBase.get_trades(window_position, window_close, 1.0)
+    shape = (len(position), len(starts))
+    return M.reshape(shape), (M_diffs > 0).sum(axis=1).reshape(shape), (M_diffs < 0).sum(axis=1).reshape(shape)
+
+
+def trade_chosen(position, chosen, close, starts, length: int):
+    """
+    Row chosen[w] of position traded over close[starts[w]:starts[w] + length] for every window w,
+    one batch of len(starts) x length. output: M, wins, losses (one per window).
+    """
+    index = np.asarray(starts)[:, None] + np.arange(length)
+    M, M_diffs, _ = AlgoTradeBase.get_trades(position[np.asarray(chosen)[:, None], index], close[index], 1.0)
+    return M, (M_diffs > 0).sum(axis=1), (M_diffs < 0).sum(axis=1)
+
+
+def walk_forward(comp_code, intraday_data, strategies_params, train_size: int = 126, test_size: int = 21, step=None):
+    """
+    Walk-forward backtest of one ticker over its whole daily history: windows of train_size bars
+    followed by test_size bars, every step bars (default test_size). In each window the strategy/params
+    with the best M on the train bars is traded on the test bars (out of sample).
+    The signals and positions are computed once on the whole history (see get_signals) and sliced per
+    window, so every window starts in the strategy's actual state (flat if it exited before the window).
+    output: DataFrame (WALK_FORWARD_COLUMNS), one row per window.
+    """
+    store = get_data_store(comp_code, intraday_data)
+    if store is None:
+        return pd.DataFrame(columns=WALK_FORWARD_COLUMNS)
+    df_data = store.daily.reset_index()
+    run_params = expand_params(strategies_params)
+    signals, first = get_signals(run_params, df_data)
+    close = df_data["close"].to_numpy(dtype=float)
+    starts = np.arange(first, len(close) - train_size - test_size + 1, step or test_size)
+    if not len(starts):
+        return pd.DataFrame(columns=WALK_FORWARD_COLUMNS)
+    position = AlgoTradeBase.get_positions(signals, len(close))
+    M_train, _, _ = trade_windows(position, close, starts, train_size)
+    best = np.argmax(M_train, axis=0)
+    windows = np.arange(len(starts))
+    M_test, wins, losses = trade_chosen(position, best, close, starts + train_size, test_size)
+    dates = df_data["date"].to_numpy()
+    return pd.DataFrame(
+        {
+            "comp_code": comp_code,
+            "window": windows,
+            "train_start": dates[starts],
+            "test_start": dates[starts + train_size],
+            "test_end": dates[starts + train_size + test_size - 1],
+            "strategy": [run_params[i][0] for i in best],
+            "params": [json.dumps(run_params[i][1]) for i in best],
+            "M_train": M_train[best, windows],
+            "M_test": M_test,
+            "wins_test": wins,
+            "losses_test": losses,
+        },
+        columns=WALK_FORWARD_COLUMNS,
+    )
+
+
+def walk_forward_task(task):
+    comp_code, intraday_data, strategies_params, kwargs = task
+    return walk_forward(comp_code, intraday_data, strategies_params, **kwargs)
+
+
+def walk_forward_grid(strategies_params, comp_codes, intraday_data, processes: int = None, **kwargs):
+    """
+    walk_forward of every ticker, the tickers in parallel (processes=1 runs in this process).
+    """
+    tasks = [(comp_code, intraday_data, strategies_params, kwargs) for comp_code in comp_codes]
+    if processes == 1:
+        results = list(map(walk_forward_task, tasks))
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(walk_forward_task, tasks)
+    results = [df for df in results if not df.empty]
+    if not results:
+        return pd.DataFrame(columns=WALK_FORWARD_COLUMNS)
+    return pd.concat(results, ignore_index=True)
+
+
+# EOF